@@ -1,54 +1,36 @@
 # admin/views.py —— 完全复刻你原来的风格
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from flask import Blueprint, render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request, Response, abort, stream_with_context
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
 
 from app import db
-from models import User, Post, TaikoRecord, SiteSettings, Comment
+from models import User, Post, PostImage, TaikoRecord, SiteSettings, Comment
+import log_reader
+import comment_threads
+import content_feed
+import data_export
+import db_engine
+import loading
+import markdown_cache
+from page_cache import page_cache, post_tags, taiko_tags
+import taiko_import
+import upload_store
+from pagination import Key, get_per_page, paginate
+from site_context import bump_site_context
+from sql_profiler import sql_profiler
+import csv
 import os
 
 import re
-import uuid
 from flask import current_app
 
 admin_blueprint = Blueprint('admin', __name__, template_folder='templates')
 
-UPLOAD_FOLDER = 'static/uploads/taiko'
-POST_UPLOAD_FOLDER = 'static/uploads/post'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp','bmp'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 def parse_dt_local(s: str):
     # <input type="datetime-local"> 格式: 2025-12-15T13:45
     return datetime.fromisoformat(s) if s else None
 
-def url_to_abs_path(url: str) -> str:
-    # url: /static/uploads/post/xxx.png -> 绝对路径
-    return os.path.join(current_app.root_path, url.lstrip("/"))
-
-def save_image_file(file, folder_rel: str, url_prefix: str):
-    """
-    folder_rel: 'static/uploads/post' 这种相对项目根目录的路径
-    url_prefix: '/static/uploads/post'
-    """
-    if not file or file.filename == "":
-        return None
-
-    if not allowed_file(file.filename):
-        return None
-
-    os.makedirs(os.path.join(current_app.root_path, folder_rel), exist_ok=True)
-
-    filename = secure_filename(f"{int(datetime.utcnow().timestamp())}_{uuid.uuid4().hex}_{file.filename}")
-    abs_path = os.path.join(current_app.root_path, folder_rel, filename)
-    file.save(abs_path)
-
-    return f"{url_prefix}/{filename}"
-
 def remove_image_markdown(content: str, image_url: str) -> str:
     # 删除形如 ![xxx](/static/uploads/post/xxx.png)
     pattern = rf'!\[[^\]]*\]\({re.escape(image_url)}\)'
@@ -56,9 +38,6 @@ def remove_image_markdown(content: str, image_url: str) -> str:
     content = re.sub(r'\n{3,}', '\n\n', content).strip()
     return content
 
-def extract_post_image_urls(content: str):
-    return re.findall(r'!\[.*?\]\((/static/uploads/post/[^\)]+)\)', content)
-
 @admin_blueprint.before_request
 @login_required
 def require_admin():
@@ -77,8 +56,15 @@ def dashboard():
         'taiko_count': TaikoRecord.query.count(),
     }
     # 把置顶文章查询移到这里
-    pinned_posts = Post.query.filter_by(is_pinned=True).order_by(Post.updated_at.desc()).limit(5).all()
-    return render_template('admin/admin.html', **stats, pinned_posts=pinned_posts)
+    pinned_posts = loading.apply(Post.query, 'post_row').filter_by(is_pinned=True).order_by(Post.updated_at.desc()).limit(5).all()
+    return render_template('admin/admin.html', **stats, pinned_posts=pinned_posts, page_cache_stats=page_cache.stats())
+
+@admin_blueprint.route('/page_cache/clear', methods=['POST'])
+def clear_page_cache():
+    removed = page_cache.clear()
+    page_cache.reset_stats()
+    flash(f'整页缓存已清空（{removed} 个页面）', 'success')
+    return redirect(url_for('admin.dashboard'))
 
 @admin_blueprint.route('/users')
 def view_users():
@@ -98,31 +84,94 @@ def delete_user(user_id):
         return redirect(url_for('admin.view_users'))
 
     db.session.delete(user_to_delete)
+    bump_site_context()
     db.session.commit()
+    page_cache.clear()  # 用户的文章/评论可能出现在任何页面
     flash(f'用户 {user_to_delete.username} 已删除', 'success')
     return redirect(url_for('admin.view_users'))
 
+def _log_query():
+    """日志页和下载共用的过滤参数"""
+    level = request.args.get('level', '').upper()
+    file_index = request.args.get('file', type=int)
+    return {
+        'level': level if level in log_reader.LEVELS else None,
+        'pattern': request.args.get('q', '').strip() or None,
+        'file_index': file_index,
+    }
+
 @admin_blueprint.route('/logs')
 def view_logs():
-    log_path = os.path.join(os.getcwd(), 'app.log')
-    logs = ["日志文件不存在或无法读取"]
-    if os.path.exists(log_path):
-        try:
-            # 先尝试 utf-8
-            with open(log_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            logs = lines[-50:][::-1]
-        except UnicodeDecodeError:
-            try:
-                # 如果 utf-8 失败，尝试 gbk（Windows 中文常见）
-                with open(log_path, 'r', encoding='gbk') as f:
-                    lines = f.readlines()
-                logs = lines[-50:][::-1]
-            except:
-                logs = ["日志文件编码错误，无法显示"]
-        except Exception as e:
-            logs = [f"读取错误: {str(e)}"]
-    return render_template('admin/logs.html', logs=logs)
+    base_path = os.path.abspath(current_app.config['LOG_FILE'])
+    query = _log_query()
+    limit = min(request.args.get('limit', 50, type=int) or 50, 500)
+    cursor = log_reader.LogCursor.decode(request.args.get('cursor', ''))
+
+    entries, next_cursor, error = [], None, None
+    try:
+        entries, next_cursor = log_reader.read_page(base_path, limit=limit, cursor=cursor, **query)
+    except re.error as e:
+        error = f'正则表达式无效: {e}'
+    except OSError as e:
+        error = f'读取错误: {e}'
+
+    return render_template('admin/logs.html',
+                           entries=entries,
+                           next_cursor=next_cursor.encode() if next_cursor else None,
+                           files=log_reader.log_files(base_path),
+                           levels=log_reader.LEVELS,
+                           query=query, limit=limit, error=error)
+
+@admin_blueprint.route('/logs/download')
+def download_logs():
+    """按时间顺序流式输出（可带同样的过滤条件），大范围也不会整块读进内存"""
+    base_path = os.path.abspath(current_app.config['LOG_FILE'])
+    query = _log_query()
+    try:
+        log_reader.compile_pattern(query['pattern'])
+    except re.error as e:
+        flash(f'正则表达式无效: {e}', 'danger')
+        return redirect(url_for('admin.view_logs'))
+
+    lines = log_reader.iter_raw(base_path, limit=request.args.get('limit', type=int), **query)
+    return Response(stream_with_context(lines), mimetype='text/plain; charset=utf-8',
+                    headers={'Content-Disposition': 'attachment; filename=app-logs.txt'})
+
+@admin_blueprint.route('/export/<kind>')
+def export_data(kind):
+    """文章 / 评论 / 战绩流式导出（JSON Lines 或 CSV），筛选参数同文章管理"""
+    if kind not in data_export.KINDS:
+        abort(404)
+    fmt = request.args.get('format', 'jsonl')
+    try:
+        chunks = data_export.stream(kind, fmt, request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(request.referrer or url_for('admin.manage_articles'))
+
+    current_app.logger.info(f'[EXPORT] {current_user.username} 导出 {kind}.{fmt} {request.query_string.decode()}')
+    return Response(stream_with_context(chunks), mimetype=data_export.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={data_export.filename(kind, fmt)}'})
+
+@admin_blueprint.route('/sql')
+def sql_report():
+    """各 endpoint 的 SQL 条数/耗时/疑似 N+1（当前 worker 自启动或上次清空以来）"""
+    return render_template('admin/sql_report.html',
+                           endpoints=sql_profiler.report(),
+                           started_at=datetime.fromtimestamp(sql_profiler.started_at),
+                           threshold=current_app.config['SQL_N_PLUS_ONE_THRESHOLD'],
+                           pid=os.getpid())
+
+@admin_blueprint.route('/sql/reset', methods=['POST'])
+def reset_sql_report():
+    sql_profiler.reset()
+    flash('SQL 统计已清空', 'success')
+    return redirect(url_for('admin.sql_report'))
+
+@admin_blueprint.route('/database')
+def database_settings():
+    """数据库引擎实际生效的设置：连接池、SQLite PRAGMA（当前 worker）"""
+    return render_template('admin/database.html', settings=db_engine.effective_settings(current_app), pid=os.getpid())
 
 @admin_blueprint.route('/settings', methods=['GET', 'POST'])
 def site_settings():
@@ -131,7 +180,9 @@ def site_settings():
         for key, value in request.form.items():
             if hasattr(settings, key):
                 setattr(settings, key, value)
+        bump_site_context()
         db.session.commit()
+        page_cache.clear()  # 站点标题、页脚在每个页面上
         flash('网站设置已更新', 'success')
         return redirect(url_for('admin.site_settings'))
     return render_template('admin/settings.html', settings=settings)
@@ -155,8 +206,8 @@ def write_post():
         if 'images' in request.files:
             files = request.files.getlist('images')
             for file in files:
-                url = save_image_file(file, folder_rel=POST_UPLOAD_FOLDER, url_prefix="/static/uploads/post")
-                if url:
+                url = upload_store.store(file, 'post')  # 同一张图重复上传只存一份
+                if url and url not in uploaded_images:
                     uploaded_images.append(url)
 
         if uploaded_images:
@@ -173,8 +224,14 @@ def write_post():
         if created_at:
             post.created_at = created_at  # Post 本身就有 created_at 字段 :contentReference[oaicite:8]{index=8}
 
+        # 发布时就渲染好 HTML，详情页不再跑 Markdown
+        markdown_cache.refresh_post(post)
+        upload_store.sync_post_images(post)
+
         db.session.add(post)
+        bump_site_context()
         db.session.commit()
+        page_cache.invalidate('posts')
 
         flash('文章发布成功！图片已嵌入', 'success')
         return redirect(url_for('admin.dashboard'))
@@ -242,41 +299,38 @@ def edit_article(post_id):
             # 删除
             if idx in delete_indexes:
                 content = remove_image_markdown(content, old_url)
-                abs_path = url_to_abs_path(old_url)
-                if os.path.exists(abs_path):
-                    os.remove(abs_path)
                 continue
 
             # 替换（replace_0, replace_1...）
             f = request.files.get(f"replace_{idx}")
             if f and f.filename:
-                new_url = save_image_file(f, folder_rel=POST_UPLOAD_FOLDER, url_prefix="/static/uploads/post")
+                new_url = upload_store.store(f, 'post')
                 if new_url:
-                    # 替换内容里的 URL（只替换一次）
+                    # 替换内容里的 URL（只替换一次）；旧文件没有别的引用时，保存后会被删掉
                     content = content.replace(old_url, new_url, 1)
-                    # 删除旧文件
-                    abs_path = url_to_abs_path(old_url)
-                    if os.path.exists(abs_path):
-                        os.remove(abs_path)
 
         # 3) 追加新图（new_images）
         new_urls = []
         for f in request.files.getlist("new_images"):
-            url = save_image_file(f, folder_rel=POST_UPLOAD_FOLDER, url_prefix="/static/uploads/post")
-            if url:
+            url = upload_store.store(f, 'post')
+            if url and url not in new_urls:
                 new_urls.append(url)
 
         if new_urls:
             content = content.rstrip() + "\n\n" + "\n".join(f"![新上传图片]({u})" for u in new_urls)
 
         post.content = content
-        post.content_html = None  # 关键：清空缓存HTML :contentReference[oaicite:10]{index=10}
+        markdown_cache.invalidate_post(post)  # 关键：正文变了，重新渲染缓存HTML
+        released = upload_store.sync_post_images(post)  # 图片引用跟着正文走
+        bump_site_context()
 
         db.session.commit()
+        page_cache.invalidate(*post_tags(post.id))
+        upload_store.collect(released)
         flash('文章更新成功', 'success')
         return redirect(url_for('admin.manage_articles'))
 
-    image_urls = extract_post_image_urls(post.content)  # 你原来用 regex 提取 :contentReference[oaicite:11]{index=11}
+    image_urls = [image.url for image in post.images.order_by(PostImage.id)]
     return render_template('admin/edit_article.html', post=post, image_urls=image_urls)
 
 
@@ -324,8 +378,8 @@ def add_taiko():
         # 多张截图上传
         screenshot_urls = []
         for f in request.files.getlist('screenshots'):  # 模板要改字段名
-            url = save_image_file(f, folder_rel='static/uploads/taiko', url_prefix="/static/uploads/taiko")
-            if url:
+            url = upload_store.store(f, 'taiko')
+            if url and url not in screenshot_urls:
                 screenshot_urls.append(url)
 
         # 兼容旧字段：screenshot 放第一张（你的 TaikoRecord 只有一个 screenshot 字段） :contentReference[oaicite:16]{index=16}
@@ -353,55 +407,71 @@ def add_taiko():
             record.bad = int(request.form.get('bad', 0))
             record.crown = request.form['crown']
 
+        upload_store.sync_record_images(record)
         db.session.add(record)
+        bump_site_context()
         db.session.commit()
+        page_cache.invalidate('taiko')
         flash('太鼓战绩上传成功！', 'success')
         return redirect(url_for('admin.dashboard'))
 
     return render_template('admin/add_taiko.html')
 
 
+# admin/views.py —— 批量导入战绩（CSV / JSON，上传时已流式落盘，这里边读边按批写入）
+@admin_blueprint.route('/import_taiko', methods=['GET', 'POST'])
+def import_taiko():
+    report = None
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename:
+            flash('请选择要导入的文件', 'danger')
+            return redirect(url_for('admin.import_taiko'))
+        fmt = taiko_import.detect_format(file.filename)
+        if fmt is None:
+            flash('只支持 .csv / .json / .jsonl 文件', 'danger')
+            return redirect(url_for('admin.import_taiko'))
+        try:
+            report = taiko_import.import_rows(taiko_import.iter_rows(file.stream, fmt), current_user)
+        except (ValueError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'文件解析失败：{e}（之前的批次已导入）', 'danger')
+            return redirect(url_for('admin.import_taiko'))
+        finally:
+            file.close()
+        current_app.logger.info(f'批量导入战绩: {file.filename}，{report}')
+        flash(f'导入完成：{report}', 'warning' if report.invalid else 'success')
+
+    return render_template('admin/import_taiko.html', report=report, fields=taiko_import.FIELDS)
+
+
 # admin/views.py —— 置顶管理 + 切换置顶状态
 @admin_blueprint.route('/pin_post/<int:post_id>')
 def pin_post(post_id):
     post = Post.query.get_or_404(post_id)
     post.is_pinned = not post.is_pinned
     db.session.commit()
+    page_cache.invalidate(*post_tags(post.id))
     flash(f"文章《{post.title}》已{'置顶' if post.is_pinned else '取消置顶'}", 'success')
     return redirect(url_for('admin.dashboard'))
 
 @admin_blueprint.route('/pinned')
 def pinned_posts():
-    posts = Post.query.filter_by(is_pinned=True).order_by(Post.updated_at.desc()).all()
+    posts = paginate(loading.apply(Post.query, 'post_row').filter_by(is_pinned=True), [Key(Post.updated_at), Key(Post.id)])
     return render_template('admin/pinned.html', posts=posts)
 
 ## ==================== 文章管理 + 筛选 ====================
 @admin_blueprint.route('/articles')
 def manage_articles():
-    # 筛选参数
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    category = request.args.get('category')
-    search_query = request.args.get('q')
-
-    # 查询基础
-    query = Post.query.order_by(Post.created_at.desc())
-
-    # 日期筛选
-    if start_date:
-        query = query.filter(Post.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Post.created_at <= datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
-
-    # 分类筛选
-    if category and category != 'all':
-        query = query.filter_by(category=category)
-
-    # 搜索
-    if search_query:
-        query = query.filter(Post.title.contains(search_query) | Post.content.contains(search_query))
-
-    posts = query.all()
+    # 筛选（日期范围、分类、关键词）和导出共用一套
+    try:
+        conditions = data_export.post_conditions(request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        conditions = []
+    query = loading.apply(Post.query, 'post_row').filter(*conditions)
+
+    posts = paginate(query, [Key(Post.created_at), Key(Post.id)])
     return render_template('admin/articles.html', posts=posts)
 
 
@@ -420,27 +490,28 @@ def delete_image():
         flash('缺少 post_id', 'danger')
         return redirect(request.referrer or url_for('admin.manage_articles'))
 
-    if not image_url.startswith('/static/uploads/post/'):
+    post = Post.query.get_or_404(post_id)
+
+    # 按 (post_id, url) 唯一索引查引用，不再扫正文
+    if not post.images.filter_by(url=image_url).first():
         flash('无效的图片路径', 'danger')
         return redirect(url_for('admin.edit_article', post_id=post_id))
 
-    post = Post.query.get_or_404(post_id)
-
     # 1) 从 Markdown 内容里移除 ![...](url)
     pattern = rf'!\[[^\]]*\]\({re.escape(image_url)}\)'
     post.content = re.sub(pattern, '', post.content)
     post.content = re.sub(r'\n{3,}', '\n\n', post.content).strip()
 
-    # 2) 清空缓存 HTML（否则前台可能继续显示旧内容）
-    post.content_html = None
+    # 2) 重新渲染缓存 HTML（否则前台可能继续显示旧内容）
+    markdown_cache.invalidate_post(post)
+    released = upload_store.sync_post_images(post)
+    bump_site_context()
 
     db.session.commit()
+    page_cache.invalidate(*post_tags(post_id))
 
-    # 3) 删除物理文件（用项目根路径拼绝对路径）
-    abs_path = os.path.normpath(os.path.join(current_app.root_path, image_url.lstrip('/')))
-    uploads_root = os.path.normpath(os.path.join(current_app.root_path, 'static', 'uploads', 'post')) + os.sep
-    if abs_path.startswith(uploads_root) and os.path.exists(abs_path):
-        os.remove(abs_path)
+    # 3) 别的文章/战绩也没在用时才删物理文件
+    upload_store.collect(released)
 
     flash('图片已删除', 'success')
     return redirect(url_for('admin.edit_article', post_id=post_id))
@@ -452,14 +523,19 @@ def pin_article(post_id):
     post = Post.query.get_or_404(post_id)
     post.is_pinned = not post.is_pinned
     db.session.commit()
+    page_cache.invalidate(*post_tags(post.id))
     flash(f"文章已{'置顶' if post.is_pinned else '取消置顶'}", 'success')
     return redirect(url_for('admin.manage_articles'))
 
 @admin_blueprint.route('/delete_article/<int:post_id>', methods=['POST'])
 def delete_article(post_id):
     post = Post.query.get_or_404(post_id)
+    released = upload_store.image_urls(post)
     db.session.delete(post)
+    bump_site_context()
     db.session.commit()
+    page_cache.invalidate(*post_tags(post_id))
+    upload_store.collect(released)
     flash('文章已删除', 'success')
     return redirect(url_for('admin.manage_articles'))
 
@@ -468,7 +544,7 @@ def delete_article(post_id):
 @admin_blueprint.route('/article_comments/<int:post_id>')
 def article_comments(post_id):
     post = Post.query.get_or_404(post_id)
-    comments = post.comments.order_by(Comment.created_at.desc()).all()
+    comments = comment_threads.thread(post_id, per_page=get_per_page(), prefix='')
     return render_template('admin/comments.html', post=post, comments=comments)
 
 @admin_blueprint.route('/delete_comment/<int:comment_id>', methods=['POST'])
@@ -477,8 +553,9 @@ def delete_comment(comment_id):
     post_id = comment.post_id
     db.session.delete(comment)
     db.session.commit()
+    page_cache.invalidate(f'post:{post_id}')
     flash('评论已删除', 'success')
-    return redirect(url_for('admin.article_comments', post_id=post_id))
+    return redirect(request.referrer or url_for('admin.article_comments', post_id=post_id))
 
 # 注释掉 approve_comment（按你要求保留）
 # @admin_blueprint.route('/approve_comment/<int:comment_id>')
@@ -492,28 +569,11 @@ def delete_comment(comment_id):
 
 @admin_blueprint.route('/contents')
 def manage_contents():
-    # 获取所有内容，按时间倒序
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    records = TaikoRecord.query.order_by(TaikoRecord.played_at.desc()).all()
-
-    # 合并并排序（置顶优先）
-    contents = []
-    for item in posts + records:
-        item_type = 'post' if isinstance(item, Post) else 'record'
-        contents.append({
-            'id': item.id,
-            'type': item_type,
-            'title': item.title if item_type == 'post' else item.name,
-            'category': item.category.value if item_type == 'post' else item.main_category.value,
-            'date': item.created_at if item_type == 'post' else item.played_at,
-            'is_pinned': getattr(item, 'is_pinned', False),
-            'item': item
-        })
-
-    # 按置顶 + 时间排序
-    contents.sort(key=lambda x: (not x['is_pinned'], x['date']), reverse=True)
-
-    return render_template('admin/contents.html', contents=contents)
+    # 文章 + 战绩一条 UNION ALL，置顶优先、按时间倒序，游标分页都在数据库里
+    content_type = request.args.get('type')
+    contents = content_feed.feed_page(content_type)
+    return render_template('admin/contents.html', contents=contents, content_type=content_type,
+                           type_labels=content_feed.TYPE_LABELS)
 
 
 @admin_blueprint.route('/pin_content/<content_type>/<int:content_id>')
@@ -528,8 +588,9 @@ def pin_content(content_type, content_id):
 
     item.is_pinned = not item.is_pinned
     db.session.commit()
+    page_cache.invalidate(*(post_tags(content_id) if content_type == 'post' else taiko_tags(content_id)))
     flash('操作成功', 'success')
-    return redirect(url_for('admin.manage_contents'))
+    return redirect(request.referrer or url_for('admin.manage_contents'))
 
 @admin_blueprint.route('/delete_content/<content_type>/<int:content_id>', methods=['POST'])
 def delete_content(content_type, content_id):
@@ -541,8 +602,12 @@ def delete_content(content_type, content_id):
         flash('类型错误', 'danger')
         return redirect(url_for('admin.manage_contents'))
 
+    released = upload_store.image_urls(item)
     db.session.delete(item)
+    bump_site_context()
     db.session.commit()
+    page_cache.invalidate(*(post_tags(content_id) if content_type == 'post' else taiko_tags(content_id)))
+    upload_store.collect(released)
     flash('内容已删除', 'success')
     return redirect(url_for('admin.manage_contents'))
 
@@ -555,7 +620,8 @@ def reply_comment(comment_id):
         comment.reply = reply_text
         comment.replied_at = datetime.utcnow()
         db.session.commit()
+        page_cache.invalidate(f'post:{comment.post_id}')
         flash('回复成功', 'success')
     else:
         flash('回复内容不能为空', 'danger')
-    return redirect(url_for('admin.manage_contents'))
\ No newline at end of file
+    return redirect(request.referrer or url_for('admin.article_comments', post_id=comment.post_id))
\ No newline at end of file
@@ -2,14 +2,11 @@
 import datetime
 from datetime import datetime
 import os
-from logging.handlers import RotatingFileHandler
 import logging
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import LoginManager, current_user, login_required
 from dotenv import load_dotenv
 from flask_sqlalchemy import SQLAlchemy
-from markupsafe import Markup
-import markdown as md
 from forms import CommentForm  # 新建 forms.py 加 CommentForm
 
 from extensions import db  # Import db from extensions.py
@@ -43,10 +40,9 @@ def create_app():
 
 
     # ----------logger------------
-    handler = RotatingFileHandler('app.log', maxBytes=500000, backupCount=10)
-    handler.setLevel(logging.INFO)
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.INFO)
+    # 请求线程只入队，后台线程写 JSON Lines；多 worker 写同一个 app.log 时用文件锁协调轮转
+    import log_pipeline
+    log_pipeline.init_app(app)
     # ----------------------------
 
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
@@ -54,16 +50,27 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     app.config['RECAPTCHA_PUBLIC_KEY'] = os.getenv('RECAPTCHA_PUBLIC_KEY')
     app.config['RECAPTCHA_PRIVATE_KEY'] = os.getenv('RECAPTCHA_PRIVATE_KEY')
-    app.config['SQLALCHEMY_ECHO'] = True
+    # 打印全部 SQL 只在本地排查时打开；平时看 /admin/sql 的统计（sql_profiler.py）
+    app.config['SQLALCHEMY_ECHO'] = os.getenv('SQLALCHEMY_ECHO', '').lower() in ('1', 'true', 'yes')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 
+    # 数据库引擎配置：连接池按后端设置，SQLite 开 WAL、busy_timeout 等（多 worker 同时写时不再 database is locked）
+    import db_engine
+    db_engine.configure(app)
+
     # Initialize database
     # db = SQLAlchemy(app)
     db.init_app(app)
+    db_engine.init_app(app)
+
+    # 每个请求的 SQL 条数/耗时/疑似 N+1（最先注册，after_request 最后执行，能统计到其它钩子里的查询）
+    from sql_profiler import sql_profiler
+    sql_profiler.init_app(app)
 
     with app.app_context():
-        db.create_all()
+        from schema import sync_schema
+        sync_schema()
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -86,34 +93,77 @@ def create_app():
     app.register_blueprint(archive_blueprint, url_prefix='/archive')
     # app.register_blueprint(taiko_bp, url_prefix='/taiko')
 
-    # 注册 markdown 过滤器
-    @app.template_filter('markdown')
-    def markdown_filter(text):
-        if not text:
-            return ''
-        # 安全渲染 Markdown
-        html = md.markdown(text, extensions=['fenced_code', 'tables', 'nl2br', 'codehilite','toc','extra'])
-        return Markup(html)
+    # 注册 markdown 过滤器 + 渲染缓存命令
+    import markdown_cache
+    markdown_cache.init_app(app)
+
+    # 浏览量写回缓冲（每个 worker 攒一批再写）
+    from view_counter import view_counter
+    view_counter.init_app(app)
+
+    # 收藏判断（每个请求只查一次收藏 id）
+    import favorites
+    favorites.init_app(app)
+
+    # 游标分页（PAGE_SIZE 可配置）
+    import pagination
+    from pagination import Key, paginate
+    import loading  # 各页面的加载方案（批量带出关联、列表只取用到的列）
+    pagination.init_app(app)
+
+    # 上传图片的派生图（WebP 缩略图 + srcset）
+    from image_pipeline import image_pipeline
+    image_pipeline.init_app(app)
+
+    # 上传图片按内容哈希存储 + 引用计数（旧数据第一次启动时按正文补引用）
+    import upload_store
+    upload_store.init_app(app)
+
+    # 全文检索（SQLite FTS5，中文按二元组切词）
+    import search_index
+    search_index.init_app(app)
+
+    # 太鼓统计（每个玩家 / 每首歌每个难度的最高分、FC 数等，写战绩时同步更新）
+    import taiko_stats
+    taiko_stats.init_app(app)
+
+    # 太鼓战绩批量导入（flask taiko-import，后台也能上传）
+    import taiko_import
+    taiko_import.init_app(app)
+
+    # 评论数冗余计数（写评论时同一事务里更新）+ 评论分页
+    import comment_threads
+    comment_threads.init_app(app)
+
+    # 后台内容管理的统一内容流（文章 + 战绩 UNION ALL，数据库里排序分页）
+    import content_feed
+    content_feed.init_app(app)
+
+    # 文章 / 评论 / 战绩的流式导出（flask export-data，后台 /admin/export/<kind>）
+    import data_export
+    data_export.init_app(app)
+
+    # 未登录访客的整页缓存（多 worker 共用，后台写操作按标签失效）
+    from page_cache import page_cache
+    page_cache.init_app(app)
+
+    # 公开页面的静态导出（flask export-static，nginx 直接发；后台改动时删掉对应文件）
+    import static_export
+    static_export.init_app(app)
+
+    # 内容页的条件请求（ETag / Last-Modified，没变就回 304）
+    import conditional_get
+    from conditional_get import conditional
+    conditional_get.init_app(app)
 
     # ==================== 全局上下文处理器（base.html 核心）===================
-    # app.py 全局上下文（保持不变或简化）
-    @app.context_processor
-    def inject_global_vars():
-        from models import Post, TaikoRecord, SiteSettings
-        settings = SiteSettings.query.first() or SiteSettings()
-        return {
-            'site_title': settings.site_title,
-            'site_subtitle': settings.site_subtitle,
-            'site_description': settings.site_description,
-            'site_motto': settings.site_motto,
-            'footer_text': settings.footer_text,
-            'current_year': datetime.now().year,
-            'latest_posts': Post.query.order_by(Post.created_at.desc()).limit(6).all(),
-            'recent_taiko': TaikoRecord.query.order_by(TaikoRecord.played_at.desc()).limit(10).all(),
-        }
+    # 按需加载 + 进程内缓存，后台改动时通过版本号失效（见 site_context.py）
+    import site_context
+    site_context.init_app(app)
 
     # ==================== 主页路由（个人介绍 + 太鼓成绩）===================
     @app.route('/')
+    @conditional(conditional_get.index_validator)
     def index():
         if current_user.is_authenticated:
             user = current_user
@@ -137,31 +187,21 @@ def create_app():
         return render_template('about.html')
     # app.py —— 太鼓专页
     @app.route('/taiko')
+    @conditional(conditional_get.taiko_list_validator)
     def taiko_page():
 
+        import taiko_facets
         from models import TaikoRecord
-        # 筛选参数
-        main_cat = request.args.get('main_category')
-        sub_cat = request.args.get('sub_category')
-        difficulty = request.args.get('difficulty')
-        crown = request.args.get('crown')
-
-        records = TaikoRecord.query.order_by(TaikoRecord.played_at.desc())
-
-        if main_cat:
-            records = records.filter_by(main_category=main_cat)
-        if sub_cat:
-            records = records.filter_by(sub_category=sub_cat)
-        if difficulty:
-            records = records.filter_by(difficulty=difficulty)
-        if crown:
-            records = records.filter_by(crown=crown)
-
-        return render_template('taiko.html', records=records.all())
+        # 分面筛选：列表按条件走复合索引，各选项条数一条 GROUP BY 算出（见 taiko_facets.py）
+        filters = taiko_facets.parse_filters(request.args)
+        records = paginate(loading.apply(taiko_facets.filtered_query(filters), 'taiko_card'), [Key(TaikoRecord.played_at), Key(TaikoRecord.id)])
+        facets, total = taiko_facets.facet_groups(filters)
+        return render_template('taiko.html', records=records, facets=facets, total=total, filters=filters)
 
 
     # app.py —— 太鼓战绩详情页
     @app.route('/taiko/<int:record_id>')
+    @conditional(conditional_get.taiko_record_validator)
     def taiko_detail(record_id):
 
         from models import TaikoRecord
@@ -186,28 +226,44 @@ def create_app():
 
         from models import Comment, Post
 
-        query = request.args.get('q', '')
+        query = request.args.get('q', '').strip()
         category = request.args.get('category')
 
-        posts = Post.query
+        records = []
+        snippets = {}
+        taiko_snippets = {}
         if query:
-            posts = posts.filter(Post.title.contains(query) | Post.content.contains(query))
-        if category:
-            posts = posts.filter_by(category=category)
-        posts = posts.order_by(Post.created_at.desc()).all()
+            # 全文检索，按相关度排序并带高亮摘要（按相关度游标分页）
+            posts, snippets = search_index.search_posts(query, category=category)
+            if not category:
+                records, taiko_snippets = search_index.search_taiko(query)
+        else:
+            posts = loading.apply(Post.query, 'post_card')
+            if category:
+                posts = posts.filter_by(category=category)
+            posts = paginate(posts, [Key(Post.created_at), Key(Post.id)])
 
-        return render_template('archive/archive.html', posts=posts, records=[], query=query, current_category=category)
+        return render_template('archive/archive.html', posts=posts, records=records, query=query,
+                               current_category=category, snippets=snippets, taiko_snippets=taiko_snippets)
 
     @app.route('/post/<int:post_id>', methods=['GET', 'POST'])
+    @conditional(conditional_get.post_validator, on_not_modified=lambda post_id: view_counter.record(post_id))
     def post_detail(post_id):
 
         from models import Comment, Post
 
-        post = Post.query.get_or_404(post_id)
-        post.view_count += 1
-        db.session.commit()
+        post = loading.apply(Post.query, 'post_detail').get_or_404(post_id)
+        post.add_view()  # 只进内存缓冲，不再每次浏览都开写事务
+        # 渲染缓存：正文哈希没变就直接用 content_html，变了才重新渲染并写回
+        content_html = markdown_cache.get_post_html(post)
+        if db.session.dirty:
+            db.session.commit()
 
         form = CommentForm()
+        # 页面上的脚本用 fetch 提交（Accept: application/json），只回新评论的 HTML 片段，不重新加载整页
+        wants_json = request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+        if request.method == 'POST' and wants_json and not current_user.is_authenticated:
+            return jsonify(ok=False, errors=['登录后才能评论']), 401
         if form.validate_on_submit() and current_user.is_authenticated:
             comment = Comment(
                 content=form.content.data,
@@ -216,13 +272,20 @@ def create_app():
             )
             db.session.add(comment)
             db.session.commit()
+            page_cache.invalidate(f'post:{post_id}')
+            if wants_json:
+                return jsonify(ok=True, count=post.get_comment_count(),
+                               html=render_template('archive/comment.html', comment=comment))
             flash('评论发表成功！', 'success')
             return redirect(url_for('post_detail', post_id=post_id))
+        if request.method == 'POST' and wants_json:
+            return jsonify(ok=False, errors=[e for errors in form.errors.values() for e in errors]), 400
 
-        # 在这里排序评论
-        comments = post.comments.order_by(Comment.created_at.desc()).all()
+        # 评论分页（新的在前），作者一次批量加载
+        comments = comment_threads.thread(post_id)
 
-        return render_template('archive/post_detail.html', post=post, comment_form=form, comments=comments)
+        return render_template('archive/post_detail.html', post=post, comment_form=form, comments=comments,
+                               content_html=content_html)
 
 
 
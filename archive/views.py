@@ -4,30 +4,38 @@ from flask_login import login_required, current_user
 from app import db
 from models import User, Post, TaikoRecord, SiteSettings
 from sqlalchemy import case
+from pagination import Key, paginate
+import loading
+from conditional_get import conditional, archive_validator
 
 archive_blueprint = Blueprint('archive', __name__, template_folder='templates/archive')
 
 
 @archive_blueprint.route('/archive')
+@conditional(archive_validator)
 def archive():
     category = request.args.get('category')  # ?category=技术
 
-    # 使用 case 语句实现置顶优先排序
-    posts = Post.query.order_by(
-        case(
-            (Post.is_pinned == True, 0),  # 置顶优先级 0
-            else_=1  # 非置顶优先级 1
-        ),
-        Post.updated_at.desc(),  # 置顶按更新时间排序
-        Post.created_at.desc()  # 非置顶按创建时间排序
+    # 使用 case 语句实现置顶优先排序，再用 id 兜底保证游标稳定
+    pinned_rank = case(
+        (Post.is_pinned == True, 0),  # 置顶优先级 0
+        else_=1  # 非置顶优先级 1
     )
-
-    records = TaikoRecord.query.order_by(TaikoRecord.played_at.desc())
-
+    post_keys = [
+        Key(pinned_rank, desc=False, getter=lambda post: 0 if post.is_pinned else 1),
+        Key(Post.updated_at),  # 置顶按更新时间排序
+        Key(Post.created_at),  # 非置顶按创建时间排序
+        Key(Post.id),
+    ]
+
+    posts = loading.apply(Post.query, 'post_card')
     if category:
         posts = posts.filter_by(category=category)
 
-    return render_template('archive/archive.html', posts=posts.all(), records=records.all(), current_category=category)
+    posts = paginate(posts, post_keys)
+    records = paginate(loading.apply(TaikoRecord.query, 'taiko_card'), [Key(TaikoRecord.played_at), Key(TaikoRecord.id)], prefix='records_')
+
+    return render_template('archive/archive.html', posts=posts, records=records, current_category=category)
 
 # # 在查询时用 case 排序
 # from sqlalchemy import case
@@ -0,0 +1,95 @@
+# benchmarks/bench_auth.py —— 登录/注册接口耗时基准（p50 / p99）
+#
+# 用法（在项目根目录）：
+#     python benchmarks/bench_auth.py            # 默认每个场景 200 次
+#     python benchmarks/bench_auth.py -n 500
+#
+# 用临时 SQLite 库 + Flask test client，不会碰 instance/blog.db 和 app.log。
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(name, samples):
+    ms = [s * 1000 for s in samples]
+    print(f'{name:<28} n={len(ms):<5} p50={percentile(ms, 50):8.2f}ms  '
+          f'p99={percentile(ms, 99):8.2f}ms  mean={statistics.mean(ms):8.2f}ms')
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录/注册接口耗时基准')
+    parser.add_argument('-n', type=int, default=200, help='每个场景的请求次数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_auth_')
+    os.chdir(workdir)  # app.log 写到临时目录
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SQLALCHEMY_ECHO=False)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine.Engine').handlers.clear()
+
+    from models import User
+    with app.app_context():
+        db.session.add(User(username='bench', email='bench@example.com', password='bench123'))
+        db.session.commit()
+
+    client = app.test_client()
+
+    def get_login(_):
+        client.get('/users/login')
+
+    def post_login(_):
+        client.post('/users/login', data={'login': 'bench', 'password': 'bench123'})
+        client.get('/users/logout')
+
+    def post_login_fail(_):
+        client.post('/users/login', data={'login': 'bench', 'password': 'wrong-password'})
+
+    def post_register(i):
+        client.post('/users/register', data={
+            'username': f'user{i}_{time.time_ns()}',
+            'email': f'user{i}_{time.time_ns()}@example.com',
+            'password': 'secret123',
+            'confirm_password': 'secret123',
+        })
+
+    for fn in (get_login, post_login):  # 预热
+        timed(fn, 3)
+
+    print(f'[BENCH] 每个场景 {args.n} 次，临时目录 {workdir}')
+    report('GET  /users/login', timed(get_login, args.n))
+    report('POST /users/login (+logout)', timed(post_login, args.n))
+    report('POST /users/login (失败)', timed(post_login_fail, args.n))
+    report('POST /users/register', timed(post_register, args.n))
+
+
+if __name__ == '__main__':
+    main()
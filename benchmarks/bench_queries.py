@@ -0,0 +1,135 @@
+# benchmarks/bench_queries.py —— 热门页面的 SQL 条数检查：每页条数从小到大，条数必须不变且不超过预算
+#
+# 用法（在项目根目录）：
+#     python benchmarks/bench_queries.py              # 超预算或随页大小增长时退出码为 1
+#     python benchmarks/bench_queries.py -v           # 同时打印每个页面执行的语句
+#
+# 用临时 SQLite 库 + Flask test client，不会碰 instance/blog.db 和 app.log。
+# 条数取自 sql_profiler 的 X-DB-Query-Count 响应头；整页缓存、条件请求关掉，每次都完整渲染。
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_SIZES = (5, 50)
+
+# (名称, URL, 是否登录, 最多几条 SQL)
+# 预算就是现在的条数（含固定开销：当前用户、站点版本号、收藏 id 等），页面改动让条数变多时这里会报出来
+VIEWS = (
+    ('archive', '/archive/archive', False, 3),
+    ('archive (登录)', '/archive/archive', True, 5),
+    ('archive?category', '/archive/archive?category=TECH', False, 3),
+    ('search', '/search?q=基准', False, 5),
+    ('search (无关键词)', '/search', False, 2),
+    ('my_favorites', '/users/my_favorites', True, 4),
+    ('taiko_page', '/taiko', False, 3),
+    ('taiko_page?crown', '/taiko?crown=GOLD_FC', False, 3),
+    ('post_detail', '/post/{post_id}', False, 4),
+    ('post_detail (登录)', '/post/{post_id}', True, 4),
+)
+
+
+def seed(db, n_posts=120, n_records=120, n_comments=120):
+    """两个用户、足够翻好几页的文章 / 战绩 / 评论 / 收藏；返回评论最多的文章 id"""
+    from models import Category, Comment, Favorite, Post, TaikoRecord, User
+
+    alice = User(username='alice', email='alice@example.com', password='bench123')
+    bob = User(username='bob', email='bob@example.com', password='bench123')
+    db.session.add_all([alice, bob])
+    categories = list(Category)
+    start = datetime(2024, 1, 1)
+    posts = [Post(title=f'基准文章 {i}', content=f'基准 正文 {i}\n\n' + '内容 ' * 200, author=alice,
+                  category=categories[i % len(categories)], slug=f'bench-{i}', is_pinned=i < 2)
+             for i in range(n_posts)]
+    records = [TaikoRecord('SONG', f'基准曲 {i}', alice if i % 2 else bob, difficulty='鬼', score=900000 + i,
+                           good=900, ok=10, bad=0, crown='GOLD_FC' if i % 3 else 'RAINBOW_FC',
+                           played_at=start + timedelta(hours=i), note='基准')
+               for i in range(n_records)]
+    db.session.add_all(posts + records)
+    db.session.flush()
+    for i, post in enumerate(posts):
+        post.created_at = start + timedelta(hours=i)
+    target = posts[-1]
+    db.session.add_all([Comment(f'评论 {i}', alice if i % 2 else bob, target) for i in range(n_comments)])
+    db.session.add_all([Favorite(user_id=alice.id, post_id=post.id) for post in posts[::2]])
+    db.session.add_all([Favorite(user_id=alice.id, taiko_id=record.id) for record in records[::2]])
+    db.session.commit()
+    return target.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热门页面的 SQL 条数检查')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每个页面执行的语句')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_queries_')
+    os.chdir(workdir)  # app.log、整页缓存写到临时目录
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SQLALCHEMY_ECHO=False, SQL_PROFILE_HEADERS=True,
+                      PAGE_CACHE=False, CONDITIONAL_GET=False, VIEW_COUNT=False)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine.Engine').handlers.clear()
+
+    with app.app_context():
+        post_id = seed(db)
+
+    statements = []
+    if args.verbose:
+        event.listen(Engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: statements.append(' '.join(statement.split())))
+
+    anonymous = app.test_client()
+    member = app.test_client()
+    member.post('/users/login', data={'login': 'alice', 'password': 'bench123'})
+
+    failures = 0
+    print(f'[BENCH] 每页条数 {PAGE_SIZES}，临时目录 {workdir}')
+    print(f'{"页面":<24}{"预算":>6}' + ''.join(f'{f"per_page={n}":>14}' for n in PAGE_SIZES) + '  结果')
+    for name, url, logged_in, budget in VIEWS:
+        client = member if logged_in else anonymous
+        url = url.format(post_id=post_id)
+        client.get(url)  # 预热：站点上下文等按进程缓存的东西先加载好，不算进条数
+        counts = []
+        for per_page in PAGE_SIZES:
+            statements.clear()
+            response = client.get(url + ('&' if '?' in url else '?') + f'per_page={per_page}')
+            if response.status_code != 200:
+                counts.append(None)
+                continue
+            counts.append(int(response.headers['X-DB-Query-Count']))
+            if args.verbose:
+                print(f'  {name} per_page={per_page}:')
+                for statement, n in Counter(statements).most_common():
+                    print(f'    {n}x {statement[:160]}')
+
+        problems = []
+        if None in counts:
+            problems.append('请求失败')
+        else:
+            if len(set(counts)) > 1:
+                problems.append('随页大小增长')
+            if max(counts) > budget:
+                problems.append('超出预算')
+        failures += bool(problems)
+        print(f'{name:<24}{budget:>6}' + ''.join(f'{str(c):>14}' for c in counts) + '  ' +
+              ('、'.join(problems) if problems else 'OK'))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
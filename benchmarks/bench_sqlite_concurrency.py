@@ -0,0 +1,170 @@
+# benchmarks/bench_sqlite_concurrency.py —— SQLite 引擎配置对比：有一个进程持续写入时，几个读进程的吞吐和延迟
+#
+# 用法（在项目根目录）：
+#     python benchmarks/bench_sqlite_concurrency.py                 # 默认 4 个读进程（对应 gunicorn -w 4），每轮 3 秒
+#     python benchmarks/bench_sqlite_concurrency.py --readers 8 --seconds 5
+#
+# 两种配置各跑两轮（只读 / 读 + 一个写进程）：
+#     stock  —— SQLAlchemy、SQLite 默认设置（回滚日志，驱动默认 5 秒超时）
+#     tuned  —— db_engine 的默认配置（WAL、synchronous=NORMAL、busy_timeout、cache_size、mmap_size……）
+# 读：文章列表那条查询 + 一篇文章的评论数；写：发一条评论并更新文章的评论数、浏览量（一个事务）。
+# 每种配置用自己的临时库文件（journal_mode=WAL 会写进库文件），不会碰 instance/blog.db。
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+N_POSTS = 500
+PROFILES = ('stock', 'tuned')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_engine(path, profile):
+    """和应用里一样的引擎：tuned 用 db_engine 的连接池参数和 PRAGMA"""
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import create_engine
+    import db_engine
+
+    uri = 'sqlite:///' + path
+    if profile == 'stock':
+        return create_engine(uri)
+    engine = create_engine(uri, **db_engine.engine_options(uri, db_engine.DEFAULTS))
+    db_engine.listen(engine, db_engine.sqlite_pragmas(db_engine.DEFAULTS))
+    return engine
+
+
+def seed(path, profile):
+    sys.path.insert(0, ROOT)
+    from datetime import datetime, timedelta
+    from extensions import db
+    from models import Post, User
+
+    engine = make_engine(path, profile)
+    db.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'username': 'bench', 'email': 'bench@example.com',
+                                                'password_hash': 'x'}])
+        conn.execute(Post.__table__.insert(), [
+            {'title': f'基准文章 {i}', 'slug': f'bench-{i}', 'content': '内容 ' * 200, 'summary': '内容 ' * 50,
+             'author_id': 1, 'created_at': start + timedelta(hours=i), 'comment_count': 0}
+            for i in range(N_POSTS)])
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+    engine.dispose()
+    return journal_mode
+
+
+def reader(path, profile, deadline, results):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    engine = make_engine(path, profile)
+    latest = text('SELECT id, title, summary, category, created_at, comment_count FROM post '
+                  'ORDER BY created_at DESC, id DESC LIMIT 20')
+    comments = text('SELECT COUNT(*) FROM comment WHERE post_id = :post_id')
+    samples, errors, i = [], 0, 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(latest).all()
+                conn.execute(comments, {'post_id': i % N_POSTS + 1}).scalar()
+        except OperationalError:  # database is locked
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - started)
+        i += 1
+    engine.dispose()
+    results.put(('read', samples, errors))
+
+
+def writer(path, profile, deadline, results):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    engine = make_engine(path, profile)
+    insert = text('INSERT INTO comment (content, author_id, post_id, created_at, is_approved) '
+                  'VALUES (:content, 1, :post_id, CURRENT_TIMESTAMP, 1)')
+    update = text('UPDATE post SET comment_count = comment_count + 1, view_count = COALESCE(view_count, 0) + 1 '
+                  'WHERE id = :post_id')
+    samples, errors, i = [], 0, 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert, {'content': f'评论 {i}', 'post_id': i % N_POSTS + 1})
+                conn.execute(update, {'post_id': i % N_POSTS + 1})
+        except OperationalError:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - started)
+        i += 1
+    engine.dispose()
+    results.put(('write', samples, errors))
+
+
+def run(path, profile, readers, seconds, with_writer):
+    results = multiprocessing.Queue()
+    deadline = time.time() + 0.5 + seconds  # 0.5 秒留给进程启动
+    procs = [multiprocessing.Process(target=reader, args=(path, profile, deadline, results)) for _ in range(readers)]
+    if with_writer:
+        procs.append(multiprocessing.Process(target=writer, args=(path, profile, deadline, results)))
+    for proc in procs:
+        proc.start()
+    collected = {'read': ([], 0), 'write': ([], 0)}
+    for _ in procs:
+        kind, samples, errors = results.get()
+        total, total_errors = collected[kind]
+        collected[kind] = (total + samples, total_errors + errors)
+    for proc in procs:
+        proc.join()
+    return collected
+
+
+def describe(samples, errors, seconds):
+    if not samples:
+        return f'{0:>9.0f}/s {"-":>9} {"-":>9} {errors:>7}'
+    ms = [s * 1000 for s in samples]
+    return (f'{len(samples) / seconds:>9.0f}/s {statistics.median(ms):>7.2f}ms {percentile(ms, 99):>7.2f}ms '
+            f'{errors:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 引擎配置的并发读写对比')
+    parser.add_argument('--readers', type=int, default=4, help='读进程数')
+    parser.add_argument('--seconds', type=float, default=3.0, help='每轮时长')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_sqlite_')
+    print(f'[BENCH] {args.readers} 个读进程，每轮 {args.seconds:g} 秒，临时目录 {workdir}')
+    print(f'{"配置":<8}{"journal":<10}{"写进程":<8}{"读吞吐":>11} {"读 p50":>9} {"读 p99":>9} {"读报错":>7}'
+          f'{"写吞吐":>11} {"写 p99":>9} {"写报错":>7}')
+    for profile in PROFILES:
+        path = os.path.join(workdir, f'{profile}.db')
+        journal_mode = seed(path, profile)
+        for with_writer in (False, True):
+            collected = run(path, profile, args.readers, args.seconds, with_writer)
+            reads, read_errors = collected['read']
+            writes, write_errors = collected['write']
+            line = f'{profile:<8}{journal_mode:<10}{"有" if with_writer else "无":<8}'
+            line += describe(reads, read_errors, args.seconds)
+            if with_writer:
+                ms = [s * 1000 for s in writes]
+                line += f'{len(writes) / args.seconds:>9.0f}/s ' + (f'{percentile(ms, 99):>7.2f}ms' if ms else f'{"-":>9}')
+                line += f' {write_errors:>7}'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
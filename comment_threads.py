@@ -0,0 +1,82 @@
+# comment_threads.py —— 评论区：文章上冗余一个 comment_count，评论列表分页 + 作者批量加载
+# comment_count 和 search_index / taiko_stats 一样挂在 Session 的 after_flush 上，跟写评论在同一个事务里增减，
+# 列表页、详情页拿条数不用再对每篇文章发 COUNT；
+# 评论按 (created_at, id) 游标分页，走 ix_comment_post_created，作者按 loading 的 comment_thread 方案一条查询带出来。
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+import loading
+from extensions import db
+from pagination import Key, paginate
+
+PAGE_SIZE = 20
+PREFIX = 'comments_'   # 评论游标的参数名前缀（comments_after / comments_before）
+
+
+def thread(post_id: int, per_page: int = None, prefix: str = PREFIX):
+    """一页评论（新的在前），作者已经加载好"""
+    from models import Comment
+    query = loading.apply(Comment.query.filter_by(post_id=post_id), 'comment_thread')
+    return paginate(query, [Key(Comment.created_at), Key(Comment.id)], per_page=per_page or PAGE_SIZE, prefix=prefix)
+
+
+# ------------------- 计数维护 -------------------
+def _after_flush(session, flush_context):
+    """新增 +1、删除 -1、改了 post_id 的两边各调一次，同一个事务里写回 post.comment_count"""
+    from models import Comment, Post
+
+    delta = Counter()
+    for obj in session.new:
+        if isinstance(obj, Comment):
+            delta[obj.post_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Comment):
+            delta[obj.post_id] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Comment):
+            history = inspect(obj).attrs.post_id.history
+            if history.has_changes():
+                for post_id in history.deleted or ():
+                    delta[post_id] -= 1
+                delta[obj.post_id] += 1
+
+    table = Post.__table__
+    conn = None
+    for post_id, change in delta.items():
+        if post_id is None or not change:
+            continue
+        conn = conn or session.connection()
+        conn.execute(update(table).where(table.c.id == post_id)
+                     .values(comment_count=func.coalesce(table.c.comment_count, 0) + change,
+                             updated_at=table.c.updated_at))  # 评论不算文章更新，别动 updated_at
+
+
+def rebuild(only_missing: bool = False) -> int:
+    """按 comment 表重算 comment_count，返回更新的文章数；only_missing 只补 NULL（旧库第一次启动）"""
+    from models import Comment, Post
+
+    table = Post.__table__
+    count = (select(func.count(Comment.id)).where(Comment.post_id == table.c.id).scalar_subquery())
+    stmt = update(table).values(comment_count=count, updated_at=table.c.updated_at)
+    if only_missing:
+        stmt = stmt.where(table.c.comment_count.is_(None))
+    updated = db.session.execute(stmt).rowcount
+    db.session.commit()
+    return updated
+
+
+def init_app(app):
+    with app.app_context():
+        rebuild(only_missing=True)
+        db.session.remove()
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+    @app.cli.command('comment-counts-rebuild')
+    def comment_counts_rebuild_command():
+        """按评论表重算每篇文章的评论数"""
+        click.echo(f'[COMMENTS] 已重算 {rebuild()} 篇文章的评论数')
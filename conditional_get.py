@@ -0,0 +1,149 @@
+# conditional_get.py —— 内容页的条件请求（ETag / Last-Modified）
+# 每个页面一条轻量查询拿到“版本号”（更新时间、条数、站点版本号），
+# 浏览器/爬虫带着 If-None-Match / If-Modified-Since 回来、内容没变时直接回 304，不查正文、不渲染模板。
+# 只对未登录、没有待显示 flash 消息的 GET 生效（登录用户的页面里有收藏状态、评论表单等个人内容）。
+import hashlib
+import os
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func, select
+
+from extensions import db
+from site_context import SITE_CONTEXT_VERSION
+
+# 模板改了（重新部署）旧 ETag 也要失效：取模板文件的最新修改时间，各 worker 读到的一样
+_state = {'deploy_token': ''}
+
+
+def _site_columns() -> list:
+    """base.html 里的站点设置 / 最新文章 / 最近战绩都跟着 site_context 版本号走"""
+    from models import CacheVersion, SiteSettings
+    version = CacheVersion.__table__
+    return [
+        select(version.c.version).where(version.c.name == SITE_CONTEXT_VERSION).scalar_subquery(),
+        select(version.c.updated_at).where(version.c.name == SITE_CONTEXT_VERSION).scalar_subquery(),
+        select(func.max(SiteSettings.updated_at)).scalar_subquery(),
+    ]
+
+
+def fetch_validator(*columns):
+    """把各页面自己的列和站点版本拼成一条 SELECT，返回结果元组"""
+    row = db.session.execute(select(*columns, *_site_columns())).one()
+    return tuple(row)
+
+
+# ------------------- 各页面的版本 -------------------
+def index_validator():
+    return fetch_validator()
+
+
+def post_validator(post_id):
+    from models import Comment, Post
+    values = fetch_validator(
+        select(Post.updated_at).where(Post.id == post_id).scalar_subquery(),
+        select(Post.comment_count).where(Post.id == post_id).scalar_subquery(),
+        select(func.max(Comment.created_at)).where(Comment.post_id == post_id).scalar_subquery(),
+        select(func.max(Comment.replied_at)).where(Comment.post_id == post_id).scalar_subquery(),
+    )
+    return values if values[0] is not None else None
+
+
+def taiko_record_validator(record_id):
+    from models import TaikoRecord
+    values = fetch_validator(select(TaikoRecord.played_at).where(TaikoRecord.id == record_id).scalar_subquery())
+    return values if values[0] is not None else None
+
+
+def taiko_list_validator():
+    from models import TaikoRecord
+    return fetch_validator(
+        select(func.max(TaikoRecord.played_at)).scalar_subquery(),
+        select(func.count(TaikoRecord.id)).scalar_subquery(),
+    )
+
+
+def archive_validator():
+    from models import Post, TaikoRecord
+    return fetch_validator(
+        select(func.max(Post.updated_at)).scalar_subquery(),
+        select(func.count(Post.id)).scalar_subquery(),
+        select(func.max(TaikoRecord.played_at)).scalar_subquery(),
+        select(func.count(TaikoRecord.id)).scalar_subquery(),
+    )
+
+
+# ------------------- 判断与响应头 -------------------
+def cacheable() -> bool:
+    return (request.method in ('GET', 'HEAD')
+            and not current_user.is_authenticated
+            and not session.get('_flashes'))
+
+
+def make_etag(values) -> str:
+    digest = hashlib.sha1(_state['deploy_token'].encode())
+    digest.update(repr(values).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def last_modified(values):
+    times = [value for value in values if hasattr(value, 'timetuple')]
+    return max(times).replace(microsecond=0) if times else None
+
+
+def is_not_modified(etag: str, modified) -> bool:
+    # 两个都带时以 If-None-Match 为准（RFC 9110）
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and modified:
+        return modified <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def _set_headers(response, etag, modified):
+    response.set_etag(etag, weak=True)
+    if modified:
+        response.last_modified = modified
+    # 每次都回来问一下（304 很便宜）；登录前后内容不同，共享缓存按 Cookie 区分
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional(validator, on_not_modified=None):
+    """
+    视图装饰器：validator(**view_args) 返回版本元组（None 表示交给视图自己处理，比如 404）
+    on_not_modified(**view_args)：回 304 时也要做的事（比如记浏览量）
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['CONDITIONAL_GET'] or not cacheable():
+                return view(*args, **kwargs)
+            values = validator(**kwargs)
+            if values is None:
+                return view(*args, **kwargs)
+
+            etag = make_etag(values)
+            modified = last_modified(values)
+            if is_not_modified(etag, modified):
+                if on_not_modified is not None:
+                    on_not_modified(**kwargs)
+                return _set_headers(Response(status=304), etag, modified)
+            return _set_headers(make_response(view(*args, **kwargs)), etag, modified)
+        return wrapper
+    return decorator
+
+
+def _deploy_token(app) -> str:
+    latest = 0.0
+    for folder, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(folder, name)))
+    return str(int(latest))
+
+
+def init_app(app):
+    app.config.setdefault('CONDITIONAL_GET', True)
+    _state['deploy_token'] = _deploy_token(app)
@@ -0,0 +1,68 @@
+# content_feed.py —— 后台“内容管理”的统一内容流：文章和太鼓战绩用一条 UNION ALL 投影成
+# (type, id, title, category, date, pinned)，置顶优先、按时间倒序，排序和游标分页都在数据库里做。
+# 两边各有 (is_pinned, 时间, id) 索引，SQLite 把两路按索引顺序归并，每页只读一页的数据。
+from sqlalchemy import Integer, String, cast, literal, select, type_coerce, union_all
+
+from extensions import db
+from pagination import Key, paginate
+
+TYPES = ('post', 'record')
+TYPE_LABELS = {'post': '文章', 'record': '战绩'}
+
+
+def _pinned(column):
+    """
+    置顶标记转成 0/1：游标里要比较大小，bool 过不了游标的类型校验
+    SQLite 里布尔本来就存成 0/1，只改 Python 侧类型，不加 CAST（加了排序就用不上索引，两边都要整表排序）；
+    其它数据库（Postgres 的 boolean）真的 CAST 成整数
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return type_coerce(column, Integer)
+    return cast(column, Integer)
+
+
+def feed():
+    """UNION ALL 子查询（列：type, id, title, category, date, pinned）"""
+    from models import Post, TaikoRecord
+    posts = select(
+        literal('post').label('type'),
+        Post.id.label('id'),
+        Post.title.label('title'),
+        cast(Post.category, String).label('category'),  # 两边是不同的枚举类型，Postgres 要转成文本才能 UNION
+        Post.created_at.label('date'),
+        _pinned(Post.is_pinned).label('pinned'),
+    )
+    records = select(
+        literal('record').label('type'),
+        TaikoRecord.id,
+        TaikoRecord.name,
+        cast(TaikoRecord.main_category, String),
+        TaikoRecord.played_at,
+        _pinned(TaikoRecord.is_pinned),
+    )
+    return union_all(posts, records).subquery('content_feed')
+
+
+def feed_keys(subquery) -> list:
+    """置顶优先 -> 时间倒序 -> (type, id) 兜底保证游标唯一"""
+    return [Key(subquery.c.pinned), Key(subquery.c.date), Key(subquery.c.type), Key(subquery.c.id)]
+
+
+def feed_page(content_type: str = None, per_page: int = None):
+    """当前请求游标对应的一页；content_type 只看文章或只看战绩"""
+    subquery = feed()
+    query = db.session.query(subquery)
+    if content_type in TYPES:
+        query = query.filter(subquery.c.type == content_type)
+    return paginate(query, feed_keys(subquery), per_page=per_page)
+
+
+def init_app(app):
+    """旧库里 is_pinned 为 NULL 的行（加列之前的数据）补成 0，否则排序和游标比较会把它们漏掉"""
+    from models import Post, TaikoRecord
+    with app.app_context():
+        for model in (Post, TaikoRecord):
+            db.session.query(model).filter(model.is_pinned.is_(None)).update(
+                {model.is_pinned: False}, synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
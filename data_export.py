@@ -0,0 +1,283 @@
+# data_export.py —— 文章（带评论、图片）、评论、太鼓战绩的流式导出：JSON Lines 或 CSV
+# 按主键分批读（keyset，每批 BATCH_SIZE 行），每批读完就结束读事务：
+# 内存只跟批大小有关，和总行数无关；导出期间也不会一直占着 SQLite 的读锁挡住前台写入。
+# 代价是导出不是同一时刻的快照（导出过程中新写入的行可能带上、也可能没带上）。
+# 战绩导出的列和 taiko_import 一致，导出的文件可以直接再导入。
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select
+
+from extensions import db
+
+FORMATS = ('jsonl', 'csv')
+KINDS = ('posts', 'comments', 'taiko')
+BATCH_SIZE = 500
+
+MIMETYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+POST_FIELDS = ('id', 'title', 'slug', 'category', 'tags', 'summary', 'content', 'cover_image', 'is_published',
+               'is_pinned', 'view_count', 'author', 'created_at', 'updated_at')
+COMMENT_FIELDS = ('id', 'post_id', 'post_title', 'author', 'content', 'is_approved', 'reply', 'replied_at',
+                  'created_at')
+
+
+def _taiko_fields() -> tuple:
+    from taiko_import import FIELDS
+    return ('id',) + FIELDS + ('screenshot',)
+
+
+# CSV 里没法嵌套：文章的图片用空格拼成一列、评论只给条数（评论另外导出）
+CSV_FIELDS = {
+    'posts': POST_FIELDS + ('comment_count', 'images'),
+    'comments': COMMENT_FIELDS,
+    'taiko': None,  # 见 _taiko_fields()
+}
+
+
+# ------------------- 筛选（和后台文章管理一致） -------------------
+def _date(raw: str, name: str):
+    try:
+        return datetime.strptime(raw, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{name} 格式不对：{raw}（应为 YYYY-MM-DD）') from None
+
+
+def date_range(args, column) -> list:
+    """start_date / end_date（含当天）-> 条件列表，日期不合法抛 ValueError"""
+    conditions = []
+    if args.get('start_date'):
+        conditions.append(column >= _date(args['start_date'], 'start_date'))
+    if args.get('end_date'):
+        conditions.append(column <= _date(args['end_date'], 'end_date') + timedelta(days=1))
+    return conditions
+
+
+def post_conditions(args) -> list:
+    """admin.manage_articles 的筛选：日期范围、分类、关键词"""
+    import search_index
+    from models import Post
+
+    conditions = date_range(args, Post.created_at)
+    category = args.get('category')
+    if category and category != 'all':
+        conditions.append(Post.category == category)
+    search_query = args.get('q')
+    if search_query:
+        post_ids = search_index.match_post_ids(search_query)
+        if post_ids is None:
+            conditions.append(Post.title.contains(search_query) | Post.content.contains(search_query))
+        else:
+            conditions.append(Post.id.in_(post_ids))
+    return conditions
+
+
+def _taiko_conditions(args) -> list:
+    """游玩日期范围 + 战绩页的分面筛选（main_category / sub_category / difficulty / crown）"""
+    from models import TaikoRecord
+    from taiko_facets import parse_filters
+
+    conditions = date_range(args, TaikoRecord.played_at)
+    conditions += [getattr(TaikoRecord, name) == value for name, value in parse_filters(args).items()]
+    return conditions
+
+
+# ------------------- 分批读取 -------------------
+def _batches(stmt, id_column, batch_size: int):
+    """按 id 升序一批批取（id > 上一批最后一个），每批之间结束读事务"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            stmt.where(id_column > last_id).order_by(id_column).limit(batch_size)
+        ).mappings().all()
+        db.session.rollback()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def _grouped(stmt, key_column, ids) -> dict:
+    """{外键: [行]}，一批只查一次"""
+    groups = {}
+    for row in db.session.execute(stmt.where(key_column.in_(ids))).mappings():
+        groups.setdefault(row[key_column.key], []).append(dict(row))
+    return groups
+
+
+def _value(value):
+    value = getattr(value, 'value', value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _clean(row: dict) -> dict:
+    return {key: _value(value) for key, value in row.items()}
+
+
+def iter_posts(args, batch_size: int = BATCH_SIZE):
+    """文章 dict，带 comments（按时间）和 images（url 列表）"""
+    from models import Comment, Post, PostImage, User
+
+    stmt = (select(*(Post.__table__.c[name] for name in POST_FIELDS if name != 'author'),
+                   User.username.label('author'))
+            .join(User, User.id == Post.author_id)
+            .where(*post_conditions(args)))
+    comments = (select(Comment.post_id, Comment.id, User.username.label('author'), Comment.content,
+                       Comment.is_approved, Comment.reply, Comment.replied_at, Comment.created_at)
+                .join(User, User.id == Comment.author_id)
+                .order_by(Comment.post_id, Comment.id))
+    images = select(PostImage.post_id, PostImage.url).order_by(PostImage.post_id, PostImage.id)
+
+    for rows in _batches(stmt, Post.id, batch_size):
+        ids = [row['id'] for row in rows]
+        comment_groups = _grouped(comments, Comment.post_id, ids)
+        image_groups = _grouped(images, PostImage.post_id, ids)
+        db.session.rollback()
+        for row in rows:
+            post = _clean(row)
+            post['comments'] = [_clean({k: v for k, v in c.items() if k != 'post_id'})
+                                for c in comment_groups.get(row['id'], [])]
+            post['images'] = [image['url'] for image in image_groups.get(row['id'], [])]
+            yield post
+
+
+def iter_comments(args, batch_size: int = BATCH_SIZE):
+    """评论 dict：日期范围按评论时间，分类按所属文章"""
+    from models import Comment, Post, User
+
+    conditions = date_range(args, Comment.created_at)
+    category = args.get('category')
+    if category and category != 'all':
+        conditions.append(Post.category == category)
+    stmt = (select(Comment.id, Comment.post_id, Post.title.label('post_title'), User.username.label('author'),
+                   Comment.content, Comment.is_approved, Comment.reply, Comment.replied_at, Comment.created_at)
+            .join(Post, Post.id == Comment.post_id)
+            .join(User, User.id == Comment.author_id)
+            .where(*conditions))
+    for rows in _batches(stmt, Comment.id, batch_size):
+        for row in rows:
+            yield _clean(row)
+
+
+def iter_taiko(args, batch_size: int = BATCH_SIZE):
+    """战绩 dict（列同 taiko_import.FIELDS，player 为用户名），外加 images（url 列表）"""
+    from models import TaikoRecord, TaikoRecordImage, User
+
+    table = TaikoRecord.__table__
+    stmt = (select(*(table.c[name] if name != 'player' else User.username.label('player')
+                     for name in _taiko_fields()))
+            .join(User, User.id == TaikoRecord.player_id)
+            .where(*_taiko_conditions(args)))
+    images = (select(TaikoRecordImage.taiko_record_id, TaikoRecordImage.url)
+              .order_by(TaikoRecordImage.taiko_record_id, TaikoRecordImage.id))
+
+    for rows in _batches(stmt, TaikoRecord.id, batch_size):
+        image_groups = _grouped(images, TaikoRecordImage.taiko_record_id, [row['id'] for row in rows])
+        db.session.rollback()
+        for row in rows:
+            record = _clean(row)
+            record['images'] = [image['url'] for image in image_groups.get(row['id'], [])]
+            yield record
+
+
+ITERATORS = {
+    'posts': iter_posts,
+    'comments': iter_comments,
+    'taiko': iter_taiko,
+}
+
+
+# ------------------- 序列化 -------------------
+def _csv_row(kind: str, item: dict) -> dict:
+    if kind == 'posts':
+        item = dict(item, comment_count=len(item['comments']), images=' '.join(item['images']))
+    elif kind == 'taiko':
+        item = dict(item, images=' '.join(item['images']))
+    return item
+
+
+def stream(kind: str, fmt: str, args, batch_size: int = BATCH_SIZE):
+    """
+    生成导出内容（str 块，大约每 batch_size 条一块）
+    参数不合法（日期格式等）在第一次迭代之前就抛 ValueError，方便调用方转成错误提示
+    """
+    if kind not in ITERATORS:
+        raise ValueError(f'不支持导出：{kind}')
+    if fmt not in FORMATS:
+        raise ValueError(f'不支持的格式：{fmt}')
+    for name in ('start_date', 'end_date'):
+        if args.get(name):
+            _date(args[name], name)
+
+    items = ITERATORS[kind](args, batch_size=batch_size)
+
+    def generate():
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            fields = CSV_FIELDS[kind] or _taiko_fields() + ('images',)
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+            buffer.write('\ufeff')  # BOM：Excel 打开中文不乱码，taiko_import 也认
+            writer.writeheader()
+        count = 0
+        for item in items:
+            if writer is None:
+                buffer.write(json.dumps(item, ensure_ascii=False))
+                buffer.write('\n')
+            else:
+                writer.writerow(_csv_row(kind, item))
+            count += 1
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return generate()
+
+
+def filename(kind: str, fmt: str) -> str:
+    return f'{kind}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}'
+
+
+def init_app(app):
+    @app.cli.command('export-data')
+    @click.argument('kind', type=click.Choice(KINDS))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default='jsonl', show_default=True)
+    @click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+                  help='输出文件（默认标准输出）')
+    @click.option('--start-date', help='YYYY-MM-DD（文章按发布、评论按评论、战绩按游玩时间）')
+    @click.option('--end-date', help='YYYY-MM-DD，含当天')
+    @click.option('--category', help='文章分类（TECH/LIFE/TAIKO）；战绩用 --filter main_category=SONG')
+    @click.option('--filter', 'filters', multiple=True, help='战绩分面筛选，name=value，可多次')
+    @click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True)
+    def export_data_command(kind, fmt, output, start_date, end_date, category, filters, batch_size):
+        """把文章（带评论、图片）、评论或太鼓战绩流式导出成 JSON Lines / CSV"""
+        args = {'start_date': start_date, 'end_date': end_date, 'category': category}
+        for item in filters:
+            name, _, value = item.partition('=')
+            args[name.strip()] = value.strip()
+        try:
+            chunks = stream(kind, fmt, {k: v for k, v in args.items() if v}, batch_size=max(1, batch_size))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        out = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if out is not sys.stdout:
+            click.echo(f'[EXPORT] {kind} 已导出到 {output}', err=True)
@@ -0,0 +1,158 @@
+# db_engine.py —— 数据库引擎配置：按后端（SQLite / Postgres 等）设置连接池，SQLite 每条新连接上设 PRAGMA
+# gunicorn 4 个 worker 同时读写一个 SQLite 文件。默认的回滚日志模式下，写事务要等所有读事务结束，读也要等写提交，
+# 评论、浏览量写回扎堆时就会 "database is locked"。WAL 模式下读写互不阻塞（同一时刻仍只有一个写事务），
+# busy_timeout 让撞上写锁的连接先等一会儿再报错。
+# configure(app) 在 db.init_app 之前调（连接池参数建引擎时生效），init_app(app) 在之后调（给引擎挂 connect 事件）。
+# 生效的设置在后台 /admin/database 查看；benchmarks/bench_sqlite_concurrency.py 对比有并发写入时的读吞吐。
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from extensions import db
+
+DEFAULTS = {
+    'DB_ENGINE_PROFILE': True,             # 总开关，False = SQLAlchemy / SQLite 默认设置（对比、排查用）
+    'DB_POOL_SIZE': 5,                     # 每个 worker 常驻的连接数
+    'DB_MAX_OVERFLOW': 10,                 # 高峰时最多再临时开几条
+    'DB_POOL_TIMEOUT': 10,                 # 秒：连接都被占用时最多等多久
+    'DB_POOL_RECYCLE': 1800,               # 秒：网络数据库的连接用多久换一条（防止被服务端或中间设备断开）
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',        # WAL 下 NORMAL 不会损坏库，断电时可能丢最后几个事务
+    'SQLITE_BUSY_TIMEOUT': 5000,           # 毫秒
+    'SQLITE_CACHE_SIZE': -16000,           # 负数单位是 KiB：每条连接约 16MB 页缓存
+    'SQLITE_MMAP_SIZE': 128 * 1024 * 1024,
+    'SQLITE_FOREIGN_KEYS': True,
+}
+
+# (PRAGMA, 配置项)；busy_timeout 放第一个，后面切 WAL 时碰上别的 worker 也在切就会等而不是直接报错
+SQLITE_PRAGMAS = (
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+    ('foreign_keys', 'SQLITE_FOREIGN_KEYS'),
+)
+
+# PRAGMA 读出来是数字，和配置对比时换成名字
+_SYNCHRONOUS_NAMES = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+
+
+def is_sqlite(uri) -> bool:
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory(uri) -> bool:
+    """内存库（测试用）：SQLAlchemy 用单连接池，不能设 pool_size、也没法开 WAL"""
+    url = make_url(uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+def engine_options(uri, config) -> dict:
+    """按后端给出 SQLALCHEMY_ENGINE_OPTIONS"""
+    if is_sqlite(uri):
+        if is_memory(uri):
+            return {}
+        # 本地文件没有断线这回事，不用 pre_ping / recycle
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def _pragma_value(value) -> str:
+    if isinstance(value, bool):
+        return 'ON' if value else 'OFF'
+    return str(value)
+
+
+def sqlite_pragmas(config) -> list:
+    """[(PRAGMA, 值)]，配置为 None 的跳过"""
+    return [(name, _pragma_value(config[key])) for name, key in SQLITE_PRAGMAS if config.get(key) is not None]
+
+
+def set_pragmas(dbapi_connection, pragmas) -> None:
+    """在一条 DB-API 连接上执行 PRAGMA（connect 事件、基准脚本共用）"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def listen(engine, pragmas) -> None:
+    """新建的每条连接都设一遍 PRAGMA（除 journal_mode 外都只对当前连接有效）"""
+    def on_connect(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            set_pragmas(dbapi_connection, pragmas)
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def configure(app) -> None:
+    """写入 SQLALCHEMY_ENGINE_OPTIONS（db.init_app 之前调）；手动配过的项以手动的为准"""
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri or not app.config['DB_ENGINE_PROFILE']:
+        return
+    options = engine_options(uri, app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_app(app) -> None:
+    """给 SQLite 引擎挂 PRAGMA（db.init_app 之后、第一次连库之前调）"""
+    if not app.config['DB_ENGINE_PROFILE']:
+        return
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                listen(engine, pragmas)
+
+
+# ------------------- 后台展示 -------------------
+def _actual(conn, name: str) -> str:
+    value = conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+    if name == 'synchronous':
+        return _SYNCHRONOUS_NAMES.get(value, str(value))
+    if name == 'foreign_keys':
+        return 'ON' if value else 'OFF'
+    return str(value).upper() if name == 'journal_mode' else str(value)
+
+
+def effective_settings(app) -> dict:
+    """当前 worker 里引擎实际生效的设置：后端、连接池、（SQLite）PRAGMA 的配置值和从连接上读回来的值"""
+    engine = db.engine
+    pool = engine.pool
+    settings = {
+        'backend': engine.dialect.name,
+        'driver': engine.dialect.driver,
+        'url': engine.url.render_as_string(hide_password=True),
+        'profile_enabled': app.config['DB_ENGINE_PROFILE'],
+        'engine_options': app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {},
+        'pool_class': type(pool).__name__,
+        'pool_status': pool.status(),
+        'pragmas': [],
+        'sqlite_version': None,
+    }
+    if engine.dialect.name != 'sqlite':
+        return settings
+
+    configured = dict(sqlite_pragmas(app.config)) if app.config['DB_ENGINE_PROFILE'] else {}
+    with engine.connect() as conn:
+        settings['sqlite_version'] = conn.exec_driver_sql('SELECT sqlite_version()').scalar()
+        for name, _ in SQLITE_PRAGMAS:
+            settings['pragmas'].append((name, configured.get(name), _actual(conn, name)))
+    return settings
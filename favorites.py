@@ -0,0 +1,120 @@
+# favorites.py —— 收藏查询：每个请求只查一次当前用户的收藏 id，模板里 O(1) 判断是否已收藏
+from types import SimpleNamespace
+
+from flask import g
+from flask_login import current_user
+from sqlalchemy import event, or_, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+KIND_COLUMNS = {'post': 'post_id', 'taiko': 'taiko_id'}
+
+
+def favorite_ids() -> SimpleNamespace:
+    """当前用户收藏的 post_id / taiko_id 集合（一个请求只查一次）"""
+    if 'favorite_ids' not in g:
+        posts, taiko = set(), set()
+        if current_user.is_authenticated:
+            from models import Favorite
+            rows = db.session.query(Favorite.post_id, Favorite.taiko_id) \
+                             .filter(Favorite.user_id == current_user.id).all()
+            for post_id, taiko_id in rows:
+                if post_id is not None:
+                    posts.add(post_id)
+                if taiko_id is not None:
+                    taiko.add(taiko_id)
+        g.favorite_ids = SimpleNamespace(post=posts, taiko=taiko)
+    return g.favorite_ids
+
+
+def is_favorite(kind: str, item_id: int) -> bool:
+    """模板用：{% if is_favorite('post', post.id) %}"""
+    return item_id in getattr(favorite_ids(), kind, ())
+
+
+def _insert_ignore(values: dict, index_elements: list) -> None:
+    """按唯一索引插入，已存在就什么都不做"""
+    from models import Favorite
+    table = Favorite.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        db.session.execute(insert(table).values(**values).on_conflict_do_nothing(index_elements=index_elements))
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**values))
+    except IntegrityError:
+        pass
+
+
+def toggle(user_id: int, kind: str, item_id: int) -> bool:
+    """切换收藏状态，返回切换后是否为已收藏（走 (user_id, post_id/taiko_id) 唯一索引）"""
+    from models import Favorite
+    column = KIND_COLUMNS[kind]
+    table = Favorite.__table__
+
+    deleted = db.session.execute(
+        table.delete().where(table.c.user_id == user_id, table.c[column] == item_id)
+    ).rowcount
+    if not deleted:
+        _insert_ignore({'user_id': user_id, column: item_id}, ['user_id', column])
+    db.session.commit()
+    g.pop('favorite_ids', None)
+    return not deleted
+
+
+def dedupe() -> int:
+    """删除重复收藏（建唯一索引前需要），返回删除条数"""
+    duplicated = db.session.execute(text(
+        'SELECT 1 FROM favorite GROUP BY user_id, post_id, taiko_id HAVING COUNT(*) > 1 LIMIT 1'
+    )).first()
+    if not duplicated:
+        return 0
+    result = db.session.execute(text(
+        'DELETE FROM favorite WHERE id NOT IN ('
+        'SELECT MIN(id) FROM favorite GROUP BY user_id, post_id, taiko_id)'
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def _before_flush(session, flush_context, instances):
+    """删文章 / 战绩 / 用户时先删掉指向它们的收藏（开了 foreign_keys，留着会挡住删除）"""
+    from models import Favorite, Post, TaikoRecord, User
+    ids = {Post: set(), TaikoRecord: set(), User: set()}
+    for obj in session.deleted:
+        if type(obj) in ids and obj.id is not None:
+            ids[type(obj)].add(obj.id)
+    table = Favorite.__table__
+    conditions = [column.in_(values) for column, values in
+                  ((table.c.post_id, ids[Post]), (table.c.taiko_id, ids[TaikoRecord]), (table.c.user_id, ids[User]))
+                  if values]
+    if not conditions:
+        return
+    # 已经加载进 session 的收藏也要移出去，不然 flush 时会去 UPDATE 已删掉的行
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Favorite) and (obj.post_id in ids[Post] or obj.taiko_id in ids[TaikoRecord]
+                                          or obj.user_id in ids[User]):
+            session.expunge(obj)
+    session.connection().execute(table.delete().where(or_(*conditions)))
+
+
+def init_app(app):
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+
+    app.add_template_global(is_favorite)
+    app.add_template_global(favorite_ids)
+
+    # 旧库里可能有重复收藏，清掉之后再补唯一索引
+    with app.app_context():
+        from models import Favorite
+        if dedupe():
+            app.logger.info('已清理重复收藏记录')
+        for index in Favorite.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        db.session.remove()
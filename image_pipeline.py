@@ -0,0 +1,259 @@
+# image_pipeline.py —— 上传图片的派生图：后台线程池按宽度生成 WebP，记录尺寸，页面输出 srcset/sizes
+# 原图照旧保存、照旧可访问；派生图放在同目录的 _variants/ 下，生成好之前页面直接用原图。
+import atexit
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import click
+from flask import current_app, g, has_request_context
+from markupsafe import Markup, escape
+
+from extensions import db
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 没装 Pillow：只存原图，页面照常用原图
+    Image = ImageOps = None
+
+UPLOAD_KINDS = ('post', 'taiko', 'avatar')
+VARIANT_DIR = '_variants'
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp'}
+
+DEFAULTS = {
+    'IMAGE_VARIANTS': True,
+    'IMAGE_WORKERS': 2,
+    'IMAGE_WEBP_QUALITY': 80,
+    # 每类图片生成的宽度（不会放大：原图更窄时只生成一张原尺寸的 WebP）
+    'IMAGE_VARIANT_WIDTHS': {
+        'post': (480, 960, 1600),
+        'taiko': (480, 960, 1600),
+        'avatar': (64, 128, 256),
+    },
+    # 默认的 sizes 属性（页面上大概显示多宽）
+    'IMAGE_SIZES': {
+        'post': '(min-width: 1024px) 768px, 100vw',
+        'taiko': '(min-width: 1024px) 1024px, 100vw',
+        'avatar': '128px',
+    },
+}
+
+_UPLOAD_URL_RE = re.compile(r'^/static/uploads/(post|taiko|avatar)/(?!' + VARIANT_DIR + r'/)[^/]+$')
+_IMG_TAG_RE = re.compile(r'<img\b([^>]*?)\ssrc="(/static/uploads/[^"]+)"([^>]*?)\s*/?>')
+
+
+def upload_kind(url: str):
+    """/static/uploads/post/x.png -> 'post'；不是上传目录的图返回 None"""
+    match = _UPLOAD_URL_RE.match(url or '')
+    return match.group(1) if match else None
+
+
+def variant_url(source: str, width: int) -> str:
+    folder, name = source.rsplit('/', 1)
+    stem = name.rsplit('.', 1)[0]
+    return f'{folder}/{VARIANT_DIR}/{stem}.{width}.webp'
+
+
+def build_variants(root: str, source: str, widths, quality: int) -> list:
+    """
+    生成派生图文件（只碰文件，不碰数据库，可以放进线程/进程池）
+    返回 [(url, width, height, format)]，第一项是原图本身
+    """
+    abs_path = os.path.join(root, source.lstrip('/'))
+    with Image.open(abs_path) as opened:
+        fmt = (opened.format or '').lower()
+        animated = getattr(opened, 'is_animated', False)
+        img = ImageOps.exif_transpose(opened)  # 浏览器按 EXIF 方向显示，尺寸也按转正后的算
+        rows = [(source, img.width, img.height, fmt)]
+        if animated:
+            return rows  # 动图转 WebP 会丢帧，只记尺寸
+
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        for width in sorted({min(w, img.width) for w in widths}):
+            height = max(1, round(img.height * width / img.width))
+            url = variant_url(source, width)
+            out_path = os.path.join(root, url.lstrip('/'))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+            tmp_path = out_path + '.tmp'
+            resized.save(tmp_path, 'WEBP', quality=quality, method=4)
+            os.replace(tmp_path, out_path)
+            rows.append((url, width, height, 'webp'))
+    return rows
+
+
+def save_variants(source: str, rows: list) -> None:
+    """用新生成的结果替换该图的记录（会 commit）"""
+    from models import ImageVariant
+    ImageVariant.query.filter_by(source=source).delete()
+    db.session.add_all(ImageVariant(source=source, url=url, width=w, height=h, format=fmt)
+                       for url, w, h, fmt in rows)
+    db.session.commit()
+
+
+def discard(source: str) -> None:
+    """原图被删时调用：删派生图文件和记录（由调用方 commit）"""
+    from models import ImageVariant
+    for variant in ImageVariant.query.filter_by(source=source).all():
+        if variant.url != source:
+            path = os.path.join(current_app.root_path, variant.url.lstrip('/'))
+            if os.path.exists(path):
+                os.remove(path)
+        db.session.delete(variant)
+
+
+# ------------------- 页面输出 -------------------
+def lookup(sources) -> dict:
+    """{原图 url: (原图记录, [派生图记录，按宽度升序])}，一次查询；同一请求里查过的不再查"""
+    memo = g.setdefault('image_variants', {}) if has_request_context() else {}
+    sources = {s for s in sources if upload_kind(s)}
+    missing = [s for s in sources if s not in memo]
+    if missing:
+        memo.update(_query(missing))
+    return {s: memo[s] for s in sources if memo.get(s)}
+
+
+def _query(sources) -> dict:
+    from models import ImageVariant
+    found = {source: [None, []] for source in sources}
+    rows = ImageVariant.query.filter(ImageVariant.source.in_(sources)).order_by(ImageVariant.width).all()
+    for row in rows:
+        if row.url == row.source:
+            found[row.source][0] = row
+        else:
+            found[row.source][1].append(row)
+    return {source: (original, variants) if original else None for source, (original, variants) in found.items()}
+
+
+def _picture(source: str, entry, attrs: str, sizes: str = None) -> str:
+    original, variants = entry
+    sizes = sizes or current_app.config['IMAGE_SIZES'].get(upload_kind(source), '100vw')
+    img = (f'<img{attrs} src="{escape(source)}" width="{original.width}" height="{original.height}" '
+           f'loading="lazy" decoding="async">')
+    if not variants:
+        return img
+    srcset = ', '.join(f'{escape(v.url)} {v.width}w' for v in variants)
+    # display: contents —— <picture> 不参与布局，<img> 上的 class 照旧生效
+    return (f'<picture style="display: contents">'
+            f'<source type="image/webp" srcset="{srcset}" sizes="{escape(sizes)}">{img}</picture>')
+
+
+def responsive_html(html: str) -> str:
+    """把渲染好的 HTML 里指向上传目录的 <img> 换成带 WebP srcset 的 <picture>"""
+    if not html or '/static/uploads/' not in html:
+        return html
+    found = lookup(match.group(2) for match in _IMG_TAG_RE.finditer(html))
+    if not found:
+        return html
+
+    def replace(match):
+        entry = found.get(match.group(2))
+        if entry is None:
+            return match.group(0)
+        return _picture(match.group(2), entry, match.group(1) + match.group(3))
+
+    return _IMG_TAG_RE.sub(replace, html)
+
+
+def responsive_img(url: str, alt: str = '', class_: str = '', sizes: str = None) -> Markup:
+    """模板用：{{ responsive_img(url, '头像', 'w-full h-full object-cover') }}"""
+    attrs = f' alt="{escape(alt)}"' + (f' class="{escape(class_)}"' if class_ else '')
+    entry = lookup([url]).get(url)
+    if entry is None:
+        return Markup(f'<img{attrs} src="{escape(url)}">')
+    return Markup(_picture(url, entry, attrs, sizes))
+
+
+# ------------------- 后台生成 -------------------
+class ImagePipeline:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _get_executor(self, app):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                                    thread_name_prefix='image')
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def submit(self, source: str):
+        """上传保存后调用：派生图交给后台线程池，请求不用等"""
+        app = current_app._get_current_object()
+        if not (self.available and app.config['IMAGE_VARIANTS'] and upload_kind(source)):
+            return None
+        return self._get_executor(app).submit(self._run, app, source)
+
+    @staticmethod
+    def _run(app, source):
+        kind = upload_kind(source)
+        with app.app_context():
+            try:
+                rows = build_variants(app.root_path, source, app.config['IMAGE_VARIANT_WIDTHS'][kind],
+                                      app.config['IMAGE_WEBP_QUALITY'])
+                save_variants(source, rows)
+            except Exception:
+                app.logger.exception(f'生成派生图失败: {source}')
+
+    def shutdown(self):
+        """等后台任务做完（进程退出时）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.add_template_global(responsive_img)
+
+        @app.cli.command('image-backfill')
+        @click.option('--kind', type=click.Choice(UPLOAD_KINDS), multiple=True, help='只处理某类（可重复）')
+        @click.option('--force', is_flag=True, help='已有派生图的也重新生成')
+        @click.option('--workers', type=int, default=os.cpu_count(), help='进程数')
+        def image_backfill_command(kind, force, workers):
+            """给 static/uploads/{post,taiko,avatar} 里已有的图片补派生图"""
+            from models import ImageVariant
+
+            if not self.available:
+                raise click.ClickException('没有安装 Pillow，无法生成派生图')
+
+            done = set() if force else {s for (s,) in db.session.query(ImageVariant.source).distinct()}
+            jobs = []
+            for k in kind or UPLOAD_KINDS:
+                folder = os.path.join(app.root_path, 'static', 'uploads', k)
+                if not os.path.isdir(folder):
+                    continue
+                for name in sorted(os.listdir(folder)):
+                    source = f'/static/uploads/{k}/{name}'
+                    if (os.path.isfile(os.path.join(folder, name))
+                            and name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+                            and source not in done):
+                        jobs.append((k, source))
+
+            click.echo(f'[IMAGE] 待处理 {len(jobs)} 张图片，{workers} 个进程')
+            failed = 0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(build_variants, app.root_path, source,
+                                app.config['IMAGE_VARIANT_WIDTHS'][k], app.config['IMAGE_WEBP_QUALITY']): source
+                    for k, source in jobs
+                }
+                for future in as_completed(futures):
+                    source = futures[future]
+                    try:
+                        save_variants(source, future.result())
+                    except Exception as e:
+                        failed += 1
+                        click.echo(f'[IMAGE] 失败 {source}: {e}')
+            click.echo(f'[IMAGE] 完成 {len(jobs) - failed} 张，失败 {failed} 张')
+
+
+image_pipeline = ImagePipeline()
@@ -8,6 +8,8 @@ from models import (
 from datetime import datetime, timedelta
 import random
 
+from taiko_import import import_rows
+
 app = create_app()
 
 with app.app_context():
@@ -122,35 +124,36 @@ with app.app_context():
             ("Tenjiku2000", "裏鬼", 990000, TaikoSubCategory.FULL_COMBO, CrownType.GOLD_FC, "又一个金满连"),
         ]
 
-        for name, diff, score, sub_cat, crown, note in songs:
-            record = TaikoRecord(
-                main_category=TaikoMainCategory.SONG,
-                sub_category=sub_cat,
-                name=name,
-                difficulty=diff,
-                score=score,
-                good=random.randint(800, 950),
-                ok=random.randint(50, 150),
-                bad=random.randint(0, 10),
-                crown=crown,
-                note=note,
-                player=player
-            )
-            db.session.add(record)
+        # 走批量导入（executemany + 同步统计/索引），和 flask taiko-import 同一条路径
+        now = datetime.utcnow()
+        rows = []
+        for i, (name, diff, score, sub_cat, crown, note) in enumerate(songs):
+            rows.append({
+                'main_category': TaikoMainCategory.SONG.value,
+                'sub_category': sub_cat.value,
+                'name': name,
+                'difficulty': diff,
+                'score': score,
+                'good': random.randint(800, 950),
+                'ok': random.randint(50, 150),
+                'bad': random.randint(0, 10),
+                'crown': crown.value,
+                'note': note,
+                'played_at': (now - timedelta(days=i)).isoformat(),
+            })
 
         # 段位战绩
         dans = ["十段", "名人", "玄人", "達人"]
-        for name in dans:
-            record = TaikoRecord(
-                main_category=TaikoMainCategory.DAN,
-                name=name,
-                note=f"终于达到{name}段位了！",
-                player=player
-            )
-            db.session.add(record)
-
-        db.session.commit()
-        print(f"[INIT] 添加 {len(songs)} 首歌曲战绩 + {len(dans)} 个段位战绩")
+        for i, name in enumerate(dans):
+            rows.append({
+                'main_category': TaikoMainCategory.DAN.value,
+                'name': name,
+                'note': f"终于达到{name}段位了！",
+                'played_at': (now - timedelta(days=30 * (i + 1))).isoformat(),
+            })
+
+        report = import_rows(enumerate(rows, 1), player)
+        print(f"[INIT] 添加 {len(songs)} 首歌曲战绩 + {len(dans)} 个段位战绩（{report}）")
     else:
         print(f"[INIT] 已存在 {TaikoRecord.query.count()} 条战绩，跳过添加")
 
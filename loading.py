@@ -0,0 +1,72 @@
+# loading.py —— 按视图命名的加载方案（loader profile）：每个热门页面要哪些列、哪些关联一起带出来，集中写在这里
+# 模板里逐行访问 post.author、favorite.post 这类多对一关联时，默认的懒加载是一行一条 SQL；
+# 列表页在查询上挂对应的方案（selectinload / joinedload 批量带出关联，load_only 只取卡片用得到的列），
+# SQL 条数就固定了，不随每页条数增长。benchmarks/bench_queries.py 检查各页面的条数。
+# 列表一律不取 content / content_html：卡片显示写文章时生成的 summary，内存和渲染开销不随文章长度增长。
+# 注意：load_only 之外的列访问时会再懒加载一次，模板里新用到某个字段时要同步加进对应方案。
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+# 列表卡片用到的列（分页游标用到的排序键也要在里面）
+POST_CARD_COLUMNS = ('id', 'title', 'category', 'summary', 'is_pinned', 'created_at', 'updated_at')
+# 后台文章表格（标题、分类、日期、评论数）
+POST_ROW_COLUMNS = ('id', 'title', 'category', 'is_pinned', 'comment_count', 'created_at', 'updated_at')
+TAIKO_CARD_COLUMNS = ('id', 'name', 'main_category', 'sub_category', 'difficulty', 'score', 'crown', 'played_at',
+                      'note')  # note：搜索结果的摘要
+
+
+def _columns(model, names):
+    return [getattr(model, name) for name in names]
+
+
+def _post_card():
+    from models import Post
+    return (load_only(*_columns(Post, POST_CARD_COLUMNS)),)
+
+
+def _post_row():
+    from models import Post
+    return (load_only(*_columns(Post, POST_ROW_COLUMNS)),)
+
+
+def _taiko_card():
+    from models import TaikoRecord
+    return (load_only(*_columns(TaikoRecord, TAIKO_CARD_COLUMNS)),)
+
+
+def _post_detail():
+    from models import Post
+    return (joinedload(Post.author),)
+
+
+def _comment_thread():
+    from models import Comment
+    return (selectinload(Comment.author),)
+
+
+def _favorite_list():
+    """收藏的文章和战绩各一条 IN 查询带出来"""
+    from models import Favorite, Post, TaikoRecord
+    return (
+        selectinload(Favorite.post).load_only(*_columns(Post, POST_CARD_COLUMNS)),
+        selectinload(Favorite.taiko).load_only(*_columns(TaikoRecord, TAIKO_CARD_COLUMNS)),
+    )
+
+
+PROFILES = {
+    'post_card': _post_card,            # 归档、搜索、首页最新文章的文章卡片（摘要代替正文）
+    'post_row': _post_row,              # 后台文章管理、置顶文章
+    'taiko_card': _taiko_card,          # 太鼓页、归档、搜索的战绩列表
+    'post_detail': _post_detail,        # 文章详情（作者）
+    'comment_thread': _comment_thread,  # 评论区（评论作者）
+    'favorite_list': _favorite_list,    # 我的收藏
+}
+
+
+def profile(name: str) -> tuple:
+    """命名方案 -> loader option 元组"""
+    return PROFILES[name]()
+
+
+def apply(query, name: str):
+    """query.options(*profile(name))"""
+    return query.options(*profile(name))
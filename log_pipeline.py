@@ -0,0 +1,203 @@
+# log_pipeline.py —— 日志管道：请求线程只把记录丢进有界队列，后台线程写 JSON Lines 文件
+# 4 个 gunicorn worker 写同一个 app.log：写入和轮转都先拿文件锁（flock），
+# 某个 worker 轮转之后，其它 worker 发现 inode 变了就重新打开，不会再互相截断。
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import has_request_context, request
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地调试：只有一个进程，不需要跨进程锁
+    fcntl = None
+
+OVERFLOW_DROP_NEW = 'drop_new'        # 队列满了丢掉新日志（默认，请求永不阻塞）
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # 丢掉最旧的一条，保留最新的
+OVERFLOW_BLOCK = 'block'              # 等待队列腾出位置（最多 LOG_BLOCK_TIMEOUT 秒）
+
+DEFAULTS = {
+    'LOG_FILE': 'app.log',
+    'LOG_LEVEL': 'INFO',
+    'LOG_MAX_BYTES': 500000,
+    'LOG_BACKUP_COUNT': 10,
+    'LOG_QUEUE_SIZE': 10000,
+    'LOG_OVERFLOW': OVERFLOW_DROP_NEW,
+    'LOG_BLOCK_TIMEOUT': 0.5,
+}
+
+# 结构化字段之外的标准 LogRecord 属性，不放进 JSON 的 extra 里
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request'}
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request', None):
+            payload['request'] = record.request
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        extra = {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith('_')}
+        if extra:
+            payload['extra'] = extra
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class LockedRotatingFileHandler(RotatingFileHandler):
+    """多进程共用一个文件的轮转 handler：写入/轮转前先拿 <file>.lock 的排他锁"""
+
+    def __init__(self, filename, **kwargs):
+        kwargs.setdefault('encoding', 'utf-8')
+        super().__init__(filename, **kwargs)
+        self._lock_path = self.baseFilename + '.lock'
+        self._lock_file = open(self._lock_path, 'a') if fcntl else None
+
+    def _reopen_if_rotated(self):
+        """别的进程已经轮转过了：当前句柄指向的是 app.log.1，需要重新打开"""
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+            self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        super().close()
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class BoundedQueueHandler(QueueHandler):
+    """请求线程用：在本线程补齐请求信息后入队，队列满时按策略处理"""
+
+    def __init__(self, log_queue, overflow=OVERFLOW_DROP_NEW, block_timeout=0.5):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # 消息、异常堆栈、请求信息都要在当前线程算好，后台线程拿不到请求上下文
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context():
+            record.request = {
+                'method': request.method,
+                'path': request.path,
+                'ip': request.remote_addr,
+                'endpoint': request.endpoint,
+            }
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == OVERFLOW_BLOCK:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                try:
+                    self.queue.put_nowait(record)
+                except queue.Full:
+                    pass
+            else:
+                self.dropped += 1
+
+
+# 每个进程一套（create_app 被调多次时复用，不会重复挂 handler）
+_pipeline = {'handler': None, 'listener': None, 'file_handler': None}
+_setup_lock = threading.Lock()
+
+
+def stop():
+    """停止后台写线程，把队列里剩下的日志写完"""
+    listener = _pipeline['listener']
+    if listener is not None:
+        listener.stop()
+        _pipeline['listener'] = None
+    if _pipeline['file_handler'] is not None:
+        _pipeline['file_handler'].close()
+        _pipeline['file_handler'] = None
+    _pipeline['handler'] = None
+
+
+def get_handler():
+    return _pipeline['handler']
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    config = app.config
+
+    with _setup_lock:
+        if _pipeline['handler'] is None:
+            file_handler = LockedRotatingFileHandler(
+                config['LOG_FILE'],
+                maxBytes=config['LOG_MAX_BYTES'],
+                backupCount=config['LOG_BACKUP_COUNT'],
+            )
+            file_handler.setFormatter(JSONLinesFormatter())
+
+            log_queue = queue.Queue(maxsize=config['LOG_QUEUE_SIZE'])
+            listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(stop)
+
+            _pipeline.update(
+                handler=BoundedQueueHandler(log_queue, config['LOG_OVERFLOW'], config['LOG_BLOCK_TIMEOUT']),
+                listener=listener,
+                file_handler=file_handler,
+            )
+
+    handler = _pipeline['handler']
+    level = logging.getLevelName(str(config['LOG_LEVEL']).upper())
+    handler.setLevel(level)
+    if handler not in app.logger.handlers:
+        app.logger.addHandler(handler)
+    app.logger.setLevel(level)
@@ -0,0 +1,168 @@
+# log_reader.py —— 日志查看：从文件尾部按块倒着读，只解码要显示的行；覆盖轮转出来的 app.log.N
+import json
+import logging
+import os
+import re
+
+BLOCK_SIZE = 16 * 1024
+MAX_SCAN_LINES = 50000  # 一页最多扫描这么多行，过滤条件太苛刻时也不会把整个目录读一遍
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_LEVEL_RE = re.compile(r'\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b')
+_LEGACY_ERROR_RE = re.compile(r'^(Exception on |Traceback )')  # 旧格式里 Flask 的异常日志不带级别
+
+
+class LogCursor:
+    """翻页位置：第几个文件（0 = app.log，1 = app.log.1 ...）+ 该文件里的字节偏移"""
+
+    def __init__(self, file_index: int = 0, offset: int = None):
+        self.file_index = file_index
+        self.offset = offset
+
+    def encode(self) -> str:
+        return f'{self.file_index}:{self.offset}'
+
+    @classmethod
+    def decode(cls, value: str):
+        try:
+            file_index, offset = value.split(':', 1)
+            return cls(int(file_index), int(offset))
+        except (AttributeError, ValueError):
+            return None
+
+
+# ------------------- 文件 -------------------
+def log_files(base_path: str) -> list:
+    """[(序号, 路径, 大小)]，从新到旧：app.log, app.log.1, app.log.2 ..."""
+    files = []
+    if os.path.exists(base_path):
+        files.append((0, base_path, os.path.getsize(base_path)))
+    index = 1
+    while os.path.exists(f'{base_path}.{index}'):
+        path = f'{base_path}.{index}'
+        files.append((index, path, os.path.getsize(path)))
+        index += 1
+    return files
+
+
+def decode_line(raw: bytes) -> str:
+    """逐行解码：UTF-8 优先，旧日志里有 GBK（Windows 时期）"""
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('utf-8', errors='replace')
+
+
+def reverse_lines(path: str, end: int = None, block_size: int = BLOCK_SIZE):
+    """从 end（默认文件尾）往前按块读，产出 (行起始偏移, 原始字节)，不含换行"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        pos = size if end is None else min(end, size)
+        buffer = b''
+        while pos > 0:
+            read = min(block_size, pos)
+            pos -= read
+            f.seek(pos)
+            buffer = f.read(read) + buffer
+            lines = buffer.split(b'\n')
+            tail_end = pos + len(buffer)
+            for line in reversed(lines[1:]):
+                start = tail_end - len(line)
+                if line.strip():
+                    yield start, line.rstrip(b'\r')
+                tail_end = start - 1
+            buffer = lines[0]
+        if buffer.strip():
+            yield 0, buffer.rstrip(b'\r')
+
+
+# ------------------- 解析 -------------------
+def parse_line(text: str) -> dict:
+    """JSON Lines（新）或纯文本（旧）都转成统一结构"""
+    if text.startswith('{'):
+        try:
+            record = json.loads(text)
+            return {
+                'ts': record.get('ts'),
+                'level': record.get('level'),
+                'msg': record.get('msg', ''),
+                'request': record.get('request'),
+                'exc': record.get('exc'),
+                'raw': text,
+            }
+        except ValueError:
+            pass
+    match = _LEVEL_RE.search(text)
+    level = match.group(1) if match else ('ERROR' if _LEGACY_ERROR_RE.match(text) else None)
+    return {'ts': None, 'level': level, 'msg': text,
+            'request': None, 'exc': None, 'raw': text}
+
+
+def _level_ok(entry: dict, min_level: str) -> bool:
+    if not min_level:
+        return True
+    if entry['level'] not in LEVELS:
+        return False
+    return logging.getLevelName(entry['level']) >= logging.getLevelName(min_level)
+
+
+def compile_pattern(pattern: str):
+    """正则不合法时抛 re.error，由页面提示"""
+    return re.compile(pattern, re.IGNORECASE) if pattern else None
+
+
+def _matches(entry, min_level, regex) -> bool:
+    return _level_ok(entry, min_level) and (regex is None or regex.search(entry['raw']) is not None)
+
+
+# ------------------- 查询 -------------------
+def read_page(base_path: str, limit: int = 50, level: str = None, pattern: str = None,
+              cursor: LogCursor = None, file_index: int = None):
+    """
+    最新的在前，返回 (entries, next_cursor)；next_cursor 为 None 表示没有更早的了
+    file_index: 只看某一个轮转文件
+    """
+    regex = compile_pattern(pattern)
+    cursor = cursor or LogCursor(file_index or 0, None)
+    entries = []
+    scanned = 0
+
+    for index, path, _ in log_files(base_path):
+        if index < cursor.file_index or (file_index is not None and index != file_index):
+            continue
+        end = cursor.offset if index == cursor.file_index else None
+        for start, raw in reverse_lines(path, end=end):
+            scanned += 1
+            entry = parse_line(decode_line(raw))
+            if _matches(entry, level, regex):
+                entry['file'] = index
+                entries.append(entry)
+            if len(entries) >= limit or scanned >= MAX_SCAN_LINES:
+                return entries, LogCursor(index, start)
+    return entries, None
+
+
+def iter_raw(base_path: str, level: str = None, pattern: str = None, file_index: int = None,
+             limit: int = None):
+    """按时间顺序（旧 -> 新）逐行产出，给流式下载用，内存占用恒定"""
+    regex = compile_pattern(pattern)
+    emitted = 0
+    for index, path, _ in reversed(log_files(base_path)):
+        if file_index is not None and index != file_index:
+            continue
+        with open(path, 'rb') as f:
+            for raw in f:
+                raw = raw.rstrip(b'\r\n')
+                if not raw.strip():
+                    continue
+                text = decode_line(raw)
+                if level or regex:
+                    if not _matches(parse_line(text), level, regex):
+                        continue
+                yield text + '\n'
+                emitted += 1
+                if limit and emitted >= limit:
+                    return
@@ -0,0 +1,179 @@
+# markdown_cache.py —— 文章 Markdown 渲染缓存（按内容哈希 + 扩展版本做键，持久化到 Post.content_html）
+# 顺带维护 Post.summary：写文章时从渲染后的 HTML 取一段纯文本摘要，列表页只读这一列，不用再加载整篇正文。
+import hashlib
+from collections import OrderedDict
+
+import click
+import markdown as md
+from markupsafe import Markup
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+
+from extensions import db
+from image_pipeline import responsive_html
+
+# 渲染用的扩展（改动这里或升级扩展配置时，记得改 RENDER_VERSION，旧缓存会自动失效）
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br', 'codehilite', 'toc', 'extra']
+RENDER_VERSION = 'v1:' + ','.join(MARKDOWN_EXTENSIONS)
+
+SUMMARY_LENGTH = 200    # 摘要最多多少个字符（超出截断并加 ...）
+SUMMARY_BATCH_SIZE = 100
+
+# 进程内的小缓存，给 markdown 过滤器用（太鼓备注等没有落库的内容）
+_MEMORY_CACHE_SIZE = 256
+_memory_cache = OrderedDict()
+
+
+def content_key(text: str) -> str:
+    """内容哈希：扩展版本 + Markdown 原文"""
+    digest = hashlib.sha256()
+    digest.update(RENDER_VERSION.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update((text or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def render_markdown(text: str) -> str:
+    """直接调用 Markdown 引擎（不走缓存）"""
+    if not text:
+        return ''
+    return md.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+
+
+def render_cached(text: str) -> str:
+    """按内容哈希走进程内 LRU 缓存"""
+    if not text:
+        return ''
+    key = content_key(text)
+    html = _memory_cache.get(key)
+    if html is None:
+        html = render_markdown(text)
+        _memory_cache[key] = html
+        if len(_memory_cache) > _MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    else:
+        _memory_cache.move_to_end(key)
+    return html
+
+
+def is_fresh(post) -> bool:
+    """缓存的 HTML 是否和当前正文一致"""
+    return bool(post.content_html) and post.content_hash == content_key(post.content)
+
+
+def refresh_post(post, force: bool = False) -> bool:
+    """重新渲染文章 HTML 并写回模型（不 commit），返回是否真的渲染了"""
+    if not force and is_fresh(post):
+        return False
+    post.content_html = render_markdown(post.content)
+    post.content_hash = content_key(post.content)
+    return True
+
+
+def invalidate_post(post) -> None:
+    """正文被改动后调用：立即重新渲染，下次访问直接命中"""
+    refresh_post(post, force=True)
+
+
+def get_post_html(post) -> Markup:
+    """详情页用：命中就直接返回缓存，没命中才渲染（由调用方 commit）"""
+    if refresh_post(post):
+        # 只是补缓存，不算文章更新：把 updated_at 原值写回，避免触发 onupdate
+        flag_modified(post, 'updated_at')
+    # 图片的 srcset 按派生图表现查（派生图是后台异步生成的，不进渲染缓存）
+    return Markup(responsive_html(post.content_html or ''))
+
+
+# ------------------- 摘要 -------------------
+def make_summary(html: str, length: int = SUMMARY_LENGTH) -> str:
+    """渲染后的 HTML -> 纯文本摘要（去掉标签、合并空白，超长截断）"""
+    text = Markup(html or '').striptags()
+    if len(text) > length:
+        text = text[:length].rstrip() + '...'
+    return text
+
+
+def _before_flush(session, flush_context, instances):
+    """新文章、正文改过的文章：补齐渲染缓存并重算摘要（调用方显式设置了摘要的不动）"""
+    from models import Post
+    for post in list(session.new) + list(session.dirty):
+        if not isinstance(post, Post) or post.content is None:
+            continue
+        state = inspect(post)
+        if post not in session.new and not state.attrs.content.history.has_changes():
+            continue
+        if post.summary and state.attrs.summary.history.has_changes():
+            continue
+        refresh_post(post)
+        post.summary = make_summary(post.content_html)
+
+
+def backfill_summaries(force: bool = False) -> int:
+    """
+    给没有摘要的文章补上（force=True 全部重算），返回更新的篇数
+    按 id 分批读正文（渲染缓存新鲜就直接用 content_html），不改 updated_at
+    """
+    from models import Post
+    table = Post.__table__
+    stmt = select(table.c.id, table.c.content, table.c.content_html, table.c.content_hash)
+    if not force:
+        stmt = stmt.where(table.c.summary.is_(None))
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            stmt.where(table.c.id > last_id).order_by(table.c.id).limit(SUMMARY_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for post_id, content, html, digest in rows:
+            if not html or digest != content_key(content):
+                html = render_markdown(content)
+            db.session.execute(update(table).where(table.c.id == post_id)
+                               .values(summary=make_summary(html), updated_at=table.c.updated_at))
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+
+def init_app(app):
+    """注册 markdown 过滤器、摘要同步钩子和预渲染命令；旧库第一次启动时补齐摘要"""
+    with app.app_context():
+        from models import Post
+        if db.session.query(Post.id).filter(Post.summary.is_(None)).first():  # 走 ix_post_summary_missing
+            backfill_summaries()
+        db.session.remove()
+
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+
+    @app.template_filter('markdown')
+    def markdown_filter(text):
+        if not text:
+            return ''
+        return Markup(responsive_html(render_cached(text)))
+
+    @app.cli.command('render-posts')
+    @click.option('--force', is_flag=True, help='忽略缓存，全部重新渲染')
+    def render_posts_command(force):
+        """预渲染所有文章的 Markdown"""
+        from models import Post
+
+        rendered = 0
+        total = 0
+        for post in Post.query.order_by(Post.id).yield_per(100):
+            total += 1
+            if refresh_post(post, force=force):
+                flag_modified(post, 'updated_at')
+                rendered += 1
+        db.session.commit()
+        click.echo(f'[RENDER] 共 {total} 篇文章，重新渲染 {rendered} 篇')
+
+    @app.cli.command('post-summaries')
+    @click.option('--force', is_flag=True, help='全部重算（默认只补没有摘要的）')
+    def post_summaries_command(force):
+        """批量生成文章列表用的纯文本摘要"""
+        click.echo(f'[SUMMARY] 已更新 {backfill_summaries(force=force)} 篇文章的摘要')
@@ -4,8 +4,8 @@ from flask_login import UserMixin
 from datetime import datetime
 import enum
 from werkzeug.security import generate_password_hash, check_password_hash
-import markdown
 from typing import List, Optional
+from sqlalchemy.orm import query_expression
 
 
 # ====================== 1. 用户系统（完整版）======================
@@ -78,13 +78,22 @@ class User(UserMixin, db.Model):
         return self.posts.count()
 
     # ------------------- 太鼓相关 -------------------
+    def get_taiko_stats(self) -> 'TaikoPlayerStats':
+        """预先算好的太鼓统计（见 taiko_stats.py），没有战绩时返回全 0 的空对象"""
+        stats = db.session.get(TaikoPlayerStats, self.id) if self.id else None
+        return stats or TaikoPlayerStats.empty()
+
     def get_best_records(self, limit: int = 5) -> List['TaikoRecord']:
-        """获取用户最高分的几首曲目"""
-        return self.taiko_records.order_by(TaikoRecord.score.desc()).limit(limit).all()
+        """获取用户最高分的几首曲目（每首曲目、每个难度取最好的一条）"""
+        return (TaikoRecord.query
+                .join(TaikoSongStats, TaikoSongStats.best_record_id == TaikoRecord.id)
+                .filter(TaikoSongStats.player_id == self.id)
+                .order_by(TaikoSongStats.best_score.desc())
+                .limit(limit).all())
 
     def get_full_combo_count(self) -> int:
-        """统计 FC/AP 次数"""
-        return self.taiko_records.filter(TaikoRecord.crown.in_(['金满连', '虹满连'])).count()
+        """统计 FC 次数（金冠 + 虹冠）"""
+        return self.get_taiko_stats().full_combo_count
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -95,6 +104,11 @@ class User(UserMixin, db.Model):
 
 class Favorite(db.Model):
     __tablename__ = 'favorite'
+    __table_args__ = (
+        # 同一用户对同一内容只能收藏一次；另一列为 NULL 时互不冲突
+        db.Index('ux_favorite_user_post', 'user_id', 'post_id', unique=True),
+        db.Index('ux_favorite_user_taiko', 'user_id', 'taiko_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -145,13 +159,20 @@ class Category(enum.Enum):
 # ====================== 3. 文章系统（完整版）======================
 class Post(db.Model):
     __tablename__ = 'post'
+    __table_args__ = (
+        # 后台内容管理：置顶优先按发布时间倒序（见 content_feed）
+        db.Index('ix_post_pinned_created', 'is_pinned', 'created_at', 'id'),
+        # 还没有摘要的文章（启动时检查要不要补，不用扫全表）
+        db.Index('ix_post_summary_missing', 'id', sqlite_where=db.text('summary IS NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     slug = db.Column(db.String(200), unique=True, nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)           # Markdown 原文
     content_html = db.Column(db.Text)                      # 渲染后 HTML（缓存）
-    summary = db.Column(db.Text)                           # 摘要（可选）
+    content_hash = db.Column(db.String(64))                # 渲染缓存键（正文 + 扩展版本的 sha256）
+    summary = db.Column(db.Text)                           # 纯文本摘要（写文章时由 markdown_cache 生成，列表页用）
     category = db.Column(db.Enum(Category), default=Category.TECH)
     tags = db.Column(db.String(200))                       # 逗号分隔
     cover_image = db.Column(db.String(200))
@@ -161,6 +182,10 @@ class Post(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     is_pinned = db.Column(db.Boolean, default=False, index=True)  # 置顶
+    comment_count = db.Column(db.Integer, default=0)  # 评论数（冗余，comment_threads 随评论增删同步）
+
+    # 搜索结果用：正文里命中位置附近的一段（search_index 查询时用 with_expression 填）
+    search_window = query_expression()
 
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -188,23 +213,20 @@ class Post(db.Model):
         return f"{slug}-{int(datetime.utcnow().timestamp())}"
 
     def render_content(self) -> str:
-        """将 Markdown 渲染为 HTML（带代码高亮）"""
-        if not self.content_html:
-            self.content_html = markdown.markdown(
-                self.content,
-                extensions=['fenced_code', 'tables', 'toc', 'codehilite', 'nl2br']
-            )
+        """将 Markdown 渲染为 HTML（带代码高亮），正文没变时直接用缓存"""
+        from markdown_cache import refresh_post
+        if refresh_post(self):
             db.session.commit()
         return self.content_html
 
     def add_view(self) -> None:
-        """增加浏览量"""
-        self.view_count += 1
-        db.session.commit()
+        """增加浏览量（先记在 worker 内存里，由 view_counter 批量写回）"""
+        from view_counter import view_counter
+        view_counter.record(self.id)
 
     def get_comment_count(self) -> int:
-        """评论数"""
-        return self.comments.count()
+        """评论数（读冗余列，不发 COUNT）"""
+        return self.comment_count or 0
 
     def get_tags_list(self) -> List[str]:
         """返回标签列表"""
@@ -225,10 +247,26 @@ class Post(db.Model):
 
 
 class PostImage(db.Model):
+    """文章引用的上传图片（一篇文章一张图一行；行数就是文件的引用计数，见 upload_store.py）"""
     __tablename__ = "post_image"
+    __table_args__ = (
+        db.Index('ux_post_image_post_url', 'post_id', 'url', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False, index=True)
-    url = db.Column(db.String(300), nullable=False)  # /static/uploads/...
+    url = db.Column(db.String(300), nullable=False, index=True)  # /static/uploads/...
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ImageVariant(db.Model):
+    """上传图片的派生图（缩略图 / WebP）及尺寸；url == source 的那一行记录原图尺寸"""
+    __tablename__ = "image_variant"
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(300), nullable=False, index=True)  # 原图 /static/uploads/...
+    url = db.Column(db.String(300), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)               # webp / png / jpeg ...
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
@@ -253,15 +291,32 @@ class CrownType(enum.Enum):
 
 
 class TaikoRecordImage(db.Model):
+    """战绩引用的截图（同 PostImage，参与引用计数）"""
     __tablename__ = "taiko_record_image"
+    __table_args__ = (
+        db.Index('ux_taiko_record_image_record_url', 'taiko_record_id', 'url', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     taiko_record_id = db.Column(db.Integer, db.ForeignKey("taiko_record.id"), nullable=False, index=True)
-    url = db.Column(db.String(300), nullable=False)
+    url = db.Column(db.String(300), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class TaikoRecord(db.Model):
     __tablename__ = 'taiko_record'
+    __table_args__ = (
+        # 分面计数的 GROUP BY 只读这个索引；四个条件都选时直接按 played_at 顺序取一页
+        db.Index('ix_taiko_record_facets', 'main_category', 'sub_category', 'difficulty', 'crown', 'played_at'),
+        # 只选一个条件（最常见）时：等值 + 按时间倒序，不用临时排序
+        db.Index('ix_taiko_record_main_played', 'main_category', 'played_at'),
+        db.Index('ix_taiko_record_difficulty_played', 'difficulty', 'played_at'),
+        db.Index('ix_taiko_record_crown_played', 'crown', 'played_at'),
+        db.Index('ix_taiko_record_played', 'played_at'),
+        # 批量导入去重：同一玩家同一时间的战绩
+        db.Index('ix_taiko_record_player_played', 'player_id', 'played_at'),
+        # 后台内容管理：置顶优先按时间倒序（和文章的 ix_post_pinned_created 一起做 UNION ALL 归并）
+        db.Index('ix_taiko_record_pinned_played', 'is_pinned', 'played_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -285,7 +340,9 @@ class TaikoRecord(db.Model):
     bad = db.Column(db.Integer, default=0)
     crown = db.Column(db.Enum(CrownType), default=CrownType.CLEAR)
 
-    player_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    is_pinned = db.Column(db.Boolean, default=False)  # 置顶（后台内容管理）
+
+    player_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     # player = db.relationship('User', backref='taiko_records')
 
     # ==================== __init__ 方法（已恢复并优化） ====================
@@ -335,12 +392,8 @@ class TaikoRecord(db.Model):
         return self.bad == 0 and total_notes > 0
 
     def get_accuracy(self) -> float:
-        if self.main_category != TaikoMainCategory.SONG or self.score is None:
-            return 0.0
-        total = self.good + self.ok + self.bad
-        if total == 0:
-            return 0.0
-        return round((self.good + self.ok * 0.5) / total * 100, 2)
+        from taiko_stats import accuracy
+        return accuracy(self.main_category, self.score, self.good, self.ok, self.bad)
 
     def __repr__(self):
         return f'<Taiko {self.main_category.value} - {self.name}>'
@@ -360,9 +413,61 @@ class TaikoRecord(db.Model):
     )
 
 
+class TaikoPlayerStats(db.Model):
+    """每个玩家的太鼓统计（taiko_stats.py 在写入战绩的同一个事务里维护，别手动改）"""
+    __tablename__ = 'taiko_player_stats'
+
+    player_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)      # 全部战绩
+    song_count = db.Column(db.Integer, nullable=False, default=0)        # 歌曲战绩
+    dan_count = db.Column(db.Integer, nullable=False, default=0)         # 段位战绩
+    best_score = db.Column(db.Integer)
+    best_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    full_combo_count = db.Column(db.Integer, nullable=False, default=0)  # 金冠 + 虹冠
+    rainbow_count = db.Column(db.Integer, nullable=False, default=0)     # 虹冠
+    last_played_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def empty(cls) -> 'TaikoPlayerStats':
+        return cls(record_count=0, song_count=0, dan_count=0, best_accuracy=0.0,
+                   full_combo_count=0, rainbow_count=0)
+
+    def __repr__(self):
+        return f'<TaikoPlayerStats {self.player_id}: {self.record_count}>'
+
+
+class TaikoSongStats(db.Model):
+    """每个玩家每首歌每个难度的统计（同上）"""
+    __tablename__ = 'taiko_song_stats'
+    __table_args__ = (
+        db.Index('ux_taiko_song_stats_key', 'player_id', 'name', 'difficulty', unique=True),
+        db.Index('ix_taiko_song_stats_player_best', 'player_id', 'best_score'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False, default='')  # 没填难度的记为空串
+    play_count = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer)
+    best_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    full_combo_count = db.Column(db.Integer, nullable=False, default=0)
+    rainbow_count = db.Column(db.Integer, nullable=False, default=0)
+    best_record_id = db.Column(db.Integer, db.ForeignKey('taiko_record.id', ondelete='SET NULL'))
+    last_played_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<TaikoSongStats {self.player_id} {self.name} [{self.difficulty}]>'
+
+
 # ====================== 5. 评论系统（完整版）======================
 class Comment(db.Model):
     __tablename__ = 'comment'
+    __table_args__ = (
+        # 文章详情 / 后台评论管理：按文章取评论，(created_at, id) 游标分页
+        db.Index('ix_comment_post_created', 'post_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -406,6 +511,33 @@ class SiteSettings(db.Model):
     def __repr__(self):
         return f'<SiteSettings {self.site_title}>'
 
+# ====================== 7. 缓存版本号（各 worker 共享，用来让进程内缓存失效）======================
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        """读取当前版本号（没有记录就是 0）"""
+        version = db.session.query(cls.version).filter_by(name=name).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, name: str) -> None:
+        """版本号 +1（跟随调用方的事务一起提交）"""
+        updated = cls.query.filter_by(name=name).update(
+            {cls.version: cls.version + 1, cls.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        if not updated:
+            db.session.add(cls(name=name, version=1))
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
 # ====================== init_db 函数放最下面 ======================
 # init_db.py —— 完整初始化脚本（推荐独立文件）
 
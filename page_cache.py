@@ -0,0 +1,303 @@
+# page_cache.py —— 未登录访客的整页缓存：4 个 gunicorn worker 共用一个本地 SQLite 文件
+# 键 = 路径 + 规范化后的查询串；每页带几个标签（post:5、posts、taiko ...），后台改了什么就按标签精确失效。
+# 登录用户、有待显示 flash 消息、渲染时动过 session 的请求一律不走缓存。
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+import click
+from flask import Response, current_app, g, request, session
+from flask_login import current_user
+
+DEFAULTS = {
+    'PAGE_CACHE': True,
+    'PAGE_CACHE_PATH': None,          # 默认 instance/page_cache.sqlite
+    'PAGE_CACHE_TTL': 300,            # 秒：浏览量、派生图之类不触发失效的变化，最多滞后这么久
+    'PAGE_CACHE_MAX_ENTRIES': 5000,
+    'PAGE_CACHE_STATS_INTERVAL': 10,  # 秒：命中计数攒一会儿再写回共享库
+}
+
+# 不影响页面内容的查询参数（分享链接常带）
+IGNORED_PARAMS = ('fbclid', 'gclid')
+IGNORED_PREFIXES = ('utm_',)
+
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+# 可缓存的页面：endpoint -> 标签（按视图参数算）
+TAGS = {
+    'index': lambda: ['posts', 'taiko'],
+    'about': lambda: [],
+    'archive.archive': lambda: ['posts', 'taiko'],
+    'taiko_page': lambda: ['taiko'],
+    'taiko_detail': lambda record_id: [f'taiko:{record_id}'],
+    'post_detail': lambda post_id: [f'post:{post_id}'],
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS page (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_page_created_at ON page (created_at);
+CREATE TABLE IF NOT EXISTS page_tag (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL REFERENCES page (key) ON DELETE CASCADE,
+    PRIMARY KEY (tag, key)
+);
+CREATE INDEX IF NOT EXISTS ix_page_tag_key ON page_tag (key);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('epoch', 0);
+'''
+
+
+def tags_for(endpoint: str, view_args: dict) -> list:
+    return TAGS[endpoint](**(view_args or {}))
+
+
+def post_tags(post_id: int) -> tuple:
+    """文章变动：详情页 + 列表页"""
+    return (f'post:{post_id}', 'posts')
+
+
+def taiko_tags(record_id: int) -> tuple:
+    return (f'taiko:{record_id}', 'taiko')
+
+
+class PageCache:
+    def __init__(self):
+        self._local = threading.local()
+        self._path = None
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._last_stats_flush = time.monotonic()
+        self._app = None
+        self._listeners = []
+
+    # ------------------- 存储 -------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self._path:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn, self._local.path = conn, self._path
+        return conn
+
+    @staticmethod
+    def make_key() -> str:
+        """路径 + 排好序的查询参数（去掉跟踪参数和空值）"""
+        params = sorted(
+            (k, v) for k, v in request.args.items(multi=True)
+            if v != '' and k not in IGNORED_PARAMS and not k.startswith(IGNORED_PREFIXES)
+        )
+        return request.path + ('?' + urlencode(params) if params else '')
+
+    def get(self, key: str, ttl: int):
+        row = self._connect().execute(
+            'SELECT status, headers, body FROM page WHERE key = ? AND created_at > ?',
+            (key, time.time() - ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body = row
+        return Response(body, status=status, headers=json.loads(headers))
+
+    def set(self, key: str, endpoint: str, tags: list, response, epoch: int) -> bool:
+        """渲染期间有过失效（epoch 变了）就不写，免得把旧内容存回去"""
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._epoch(conn) != epoch:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute('DELETE FROM page WHERE key = ?', (key,))
+            conn.execute(
+                'INSERT INTO page (key, endpoint, status, headers, body, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, endpoint, response.status_code, json.dumps(headers), response.get_data(), time.time()),
+            )
+            conn.executemany('INSERT OR IGNORE INTO page_tag (tag, key) VALUES (?, ?)', [(t, key) for t in tags])
+            total = conn.execute('SELECT count(*) FROM page').fetchone()[0]
+            overflow = total - self._app.config['PAGE_CACHE_MAX_ENTRIES']
+            if overflow > 0:
+                conn.execute('DELETE FROM page WHERE key IN (SELECT key FROM page ORDER BY created_at LIMIT ?)',
+                             (overflow,))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _epoch(conn) -> int:
+        return conn.execute("SELECT value FROM meta WHERE name = 'epoch'").fetchone()[0]
+
+    def current_epoch(self) -> int:
+        return self._epoch(self._connect())
+
+    # ------------------- 失效 -------------------
+    def invalidate(self, *tags) -> int:
+        """后台写操作 commit 之后调用：删掉带这些标签的页面，返回删除数"""
+        if not tags:
+            return 0
+        self._notify(tags)
+        if self._path is None:
+            return 0
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'epoch'")
+            placeholders = ','.join('?' * len(tags))
+            removed = conn.execute(
+                f'DELETE FROM page WHERE key IN (SELECT key FROM page_tag WHERE tag IN ({placeholders}))', tags
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return removed
+
+    def clear(self) -> int:
+        """全部失效（站点设置、删用户这种影响所有页面的改动）"""
+        self._notify(None)
+        if self._path is None:
+            return 0
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'epoch'")
+        removed = conn.execute('DELETE FROM page').rowcount
+        conn.execute('COMMIT')
+        return removed
+
+    def on_invalidate(self, callback) -> None:
+        """别的页面副本（比如静态导出）跟着一起失效：callback(tags)，tags 为 None 表示全部"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _notify(self, tags) -> None:
+        for callback in self._listeners:
+            try:
+                callback(tags)
+            except Exception:
+                current_app.logger.exception('页面失效通知失败')
+
+    # ------------------- 统计 -------------------
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def flush_stats(self) -> None:
+        with self._stats_lock:
+            pending, self._stats = self._stats, Counter()
+            self._last_stats_flush = time.monotonic()
+        if not pending or self._path is None:
+            return
+        conn = self._connect()
+        conn.executemany(
+            'INSERT INTO meta (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            [(f'stat_{name}', value) for name, value in pending.items()],
+        )
+
+    def stats(self) -> dict:
+        """所有 worker 累计的 hit / miss / bypass，外加当前条目数和体积"""
+        self.flush_stats()
+        conn = self._connect()
+        stats = {name[5:]: value for name, value in
+                 conn.execute("SELECT name, value FROM meta WHERE name LIKE 'stat_%'")}
+        entries, size = conn.execute('SELECT count(*), coalesce(sum(length(body)), 0) FROM page').fetchone()
+        stats.update(entries=entries, size=size)
+        for name in ('hit', 'miss', 'bypass'):
+            stats.setdefault(name, 0)
+        lookups = stats['hit'] + stats['miss']
+        stats['hit_ratio'] = stats['hit'] / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats.clear()
+        self._connect().execute("DELETE FROM meta WHERE name LIKE 'stat_%'")
+
+    # ------------------- 请求钩子 -------------------
+    @staticmethod
+    def _cacheable() -> bool:
+        return (request.method in ('GET', 'HEAD')
+                and request.endpoint in TAGS
+                and not current_user.is_authenticated
+                and not session.get('_flashes'))
+
+    def _before_request(self):
+        config = current_app.config
+        if not config['PAGE_CACHE'] or request.endpoint not in TAGS:
+            return None
+        if not self._cacheable():
+            g.page_cache_status = 'BYPASS'
+            self._count('bypass')
+            return None
+
+        key = self.make_key()
+        cached = self.get(key, config['PAGE_CACHE_TTL'])
+        if cached is not None:
+            self._count('hit')
+            g.page_cache_status = 'HIT'
+            if request.endpoint == 'post_detail':
+                from view_counter import view_counter
+                view_counter.record(request.view_args['post_id'])
+            return cached.make_conditional(request)
+
+        self._count('miss')
+        g.page_cache_status = 'MISS'
+        g.page_cache_key = key
+        g.page_cache_epoch = self.current_epoch()
+        return None
+
+    def _after_request(self, response):
+        key = g.pop('page_cache_key', None)
+        if (key is not None and response.status_code == 200 and not response.direct_passthrough
+                and response.mimetype == 'text/html' and not session.modified):
+            self.set(key, request.endpoint, tags_for(request.endpoint, request.view_args), response,
+                     g.page_cache_epoch)
+        status = g.pop('page_cache_status', None)
+        if status:
+            response.headers['X-Page-Cache'] = status
+        if time.monotonic() - self._last_stats_flush >= current_app.config['PAGE_CACHE_STATS_INTERVAL']:
+            self.flush_stats()
+        return response
+
+    def _flush_on_exit(self):
+        try:
+            self.flush_stats()
+        except sqlite3.Error:
+            pass
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        path = app.config['PAGE_CACHE_PATH'] or os.path.join(app.instance_path, 'page_cache.sqlite')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self._app is None:
+            atexit.register(self._flush_on_exit)
+        self._app = app
+        self._path = path
+        self._connect().executescript(_SCHEMA)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        @app.cli.command('page-cache-clear')
+        def page_cache_clear_command():
+            """清空整页缓存"""
+            click.echo(f'[PAGE CACHE] 已清除 {self.clear()} 个页面')
+
+
+page_cache = PageCache()
@@ -0,0 +1,176 @@
+# pagination.py —— 通用的游标（keyset）分页：按排序键比较，不用 OFFSET，翻页再深也只扫一页的数据
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class Key:
+    """一个排序键：SQL 表达式 + 是否倒序 + 从结果对象上取值的方式"""
+
+    def __init__(self, expr, desc: bool = True, getter=None):
+        self.expr = expr
+        self.desc = desc
+        if getter is None:
+            getter = expr.key
+        self.getter = getter if callable(getter) else (lambda item, name=getter: getattr(item, name))
+
+    @property
+    def python_type(self):
+        """排序键对应的 Python 类型（校验游标用），取不到就是 None（不校验类型）"""
+        try:
+            return self.expr.type.python_type
+        except (AttributeError, NotImplementedError):
+            return None
+
+    def order_by(self, reverse: bool = False):
+        desc = self.desc != reverse
+        return self.expr.desc() if desc else self.expr.asc()
+
+    def after(self, value, reverse: bool = False):
+        """排在 value 之后（翻页方向上）的条件"""
+        desc = self.desc != reverse
+        return self.expr < value if desc else self.expr > value
+
+
+class Page:
+    """一页结果：items + 上一页/下一页游标"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, prefix: str = ''):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.prefix = prefix
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+# ------------------- 游标编码 -------------------
+def encode_cursor(values) -> str:
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _matches(value, python_type) -> bool:
+    """游标里的值和排序键类型对得上（bool 是 int 的子类，要单独区分）"""
+    if value is None or isinstance(value, (dict, list)):
+        return False
+    if python_type is datetime:
+        return isinstance(value, datetime)
+    if python_type is bool:
+        return isinstance(value, bool)
+    if python_type in (int, float):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if python_type is str:
+        return isinstance(value, str)
+    return not isinstance(value, datetime)
+
+
+def decode_cursor(cursor: str, types=None):
+    """
+    解析游标，格式不对就当没有游标（回到第一页）
+    types: 每个位置期望的 Python 类型（None 表示不限）；个数或类型对不上同样当没有游标，不会带进 SQL 比较
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            return None
+        values = [datetime.fromisoformat(v['dt']) if isinstance(v, dict) and 'dt' in v else v for v in payload]
+    except (ValueError, TypeError):
+        return None
+    if types is not None:
+        types = list(types)
+        if len(values) != len(types) or not all(_matches(v, t) for v, t in zip(values, types)):
+            return None
+    return values
+
+
+# ------------------- 分页参数 -------------------
+def get_per_page(default: int = None) -> int:
+    """每页条数：?per_page= 优先，其次 PAGE_SIZE 配置"""
+    default = default or current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    per_page = request.args.get('per_page', type=int) or default
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def _seek_condition(keys, values, reverse: bool):
+    """(k1, k2, ...) 在翻页方向上排在 values 之后：k1 > v1 OR (k1 = v1 AND k2 > v2) ..."""
+    clauses = []
+    for i, key in enumerate(keys):
+        equal = [keys[j].expr == values[j] for j in range(i)]
+        clauses.append(and_(*equal, key.after(values[i], reverse)))
+    return or_(*clauses)
+
+
+def cursor_of(keys, item) -> str:
+    return encode_cursor([key.getter(item) for key in keys])
+
+
+def paginate(query, keys, per_page: int = None, prefix: str = '') -> Page:
+    """
+    keys: [Key(...), ...]，最后一个键必须唯一（一般是 id），保证游标稳定
+    prefix: 一个页面里有多个列表时区分参数名（如 records_after）
+    """
+    per_page = per_page or get_per_page()
+    types = [key.python_type for key in keys]
+    after = decode_cursor(request.args.get(f'{prefix}after'), types)
+    before = decode_cursor(request.args.get(f'{prefix}before'), types)
+
+    reverse = before is not None and after is None
+    cursor = before if reverse else after
+    if cursor is not None:
+        query = query.filter(_seek_condition(keys, cursor, reverse))
+
+    query = query.order_by(None).order_by(*[key.order_by(reverse) for key in keys])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    # 正向翻页：多取到一条说明还有下一页；带着游标来的说明有上一页。反向翻页反过来
+    more_after, more_before = (cursor is not None, has_more) if reverse else (has_more, cursor is not None)
+    next_cursor = cursor_of(keys, rows[-1]) if rows and more_after else None
+    prev_cursor = cursor_of(keys, rows[0]) if rows and more_before else None
+    return Page(rows, next_cursor, prev_cursor, prefix)
+
+
+def page_url(page: Page, direction: str) -> str:
+    """当前页面 URL，保留其它筛选参数，只替换本列表的游标"""
+    args = request.args.to_dict()
+    args.pop(f'{page.prefix}after', None)
+    args.pop(f'{page.prefix}before', None)
+    if direction == 'next':
+        args[f'{page.prefix}after'] = page.next_cursor
+    else:
+        args[f'{page.prefix}before'] = page.prev_cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def init_app(app):
+    app.config.setdefault('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    app.add_template_global(page_url)
@@ -0,0 +1,34 @@
+# schema.py —— 轻量级表结构同步（项目没有迁移工具，新加的列/索引在这里补到旧库上）
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+
+
+def sync_schema() -> None:
+    """创建缺失的表，并给已有的表补上新增的列和索引（只增不删）"""
+    import models  # noqa: F401  确保所有模型都注册到 metadata
+
+    db.create_all()
+
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+            for index in table.indexes:
+                # 唯一索引可能因为旧数据重复建不起来，记个日志，交给对应模块清理后再建
+                try:
+                    with conn.begin_nested():
+                        index.create(conn, checkfirst=True)
+                except SQLAlchemyError as e:
+                    current_app.logger.warning(f'索引 {index.name} 创建失败: {e}')
@@ -0,0 +1,386 @@
+# search_index.py —— SQLite FTS5 全文检索（文章标题/正文/标签 + 太鼓战绩名称/备注）
+# FTS5 自带的分词器不认识中文词边界，这里在 Python 侧把中日韩文字切成二元组（bigram），
+# 英文/数字按单词小写，再交给 unicode61 按空格建索引；查询时用同样的规则切词。
+# 索引里另外在末尾附上出现过的单个汉字（unigram），只搜一个字（如“库”）时也能命中“数据库”。
+import re
+from collections import namedtuple
+
+import click
+from flask import request
+from markupsafe import Markup, escape
+from sqlalchemy import Integer, event, func, inspect, text
+from sqlalchemy.orm import Session, with_expression
+
+from extensions import db
+from pagination import Key, Page, decode_cursor, encode_cursor, get_per_page, paginate
+
+SEARCH_TABLE = 'search_index'
+SEARCH_LIMIT = 200
+# 切词规则改了要加一，启动时发现索引是旧规则建的就重建（版本号记在 CacheVersion）
+INDEX_VERSION = 2
+INDEX_VERSION_KEY = 'search_index'
+SNIPPET_WINDOW = 400   # 搜索结果摘要：从正文里截多长一段回来再高亮
+
+KIND_POST = 'post'
+KIND_TAIKO = 'taiko'
+_KIND_OFFSET = {KIND_POST: 0, KIND_TAIKO: 1}
+
+# bm25 列权重：kind, ref_id, category（不参与检索）, title, body, tags
+_BM25_WEIGHTS = '0.0, 0.0, 0.0, 10.0, 1.0, 5.0'
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'  # 假名、汉字、谚文
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W{_CJK}]+)')
+
+SearchHit = namedtuple('SearchHit', 'kind ref_id rank rowid')
+
+# 当前进程里 FTS5 是否可用（非 SQLite 或编译时没带 FTS5 时退回 LIKE）
+_state = {'enabled': False}
+
+
+# ------------------- 分词 -------------------
+def tokenize(value: str) -> list:
+    """中日韩文字切成重叠二元组，其余按单词小写"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(value or ''):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _index_text(value: str) -> str:
+    """二元组在前（短语查询要求相邻），去重后的单字附在最后"""
+    tokens = tokenize(value)
+    chars = dict.fromkeys(ch for cjk, _ in _TOKEN_RE.findall(value or '') if len(cjk) > 1 for ch in cjk)
+    return ' '.join(tokens + list(chars))
+
+
+def build_match_query(query: str):
+    """把用户输入转成 FTS5 MATCH 表达式：每个词是一个短语，词之间 AND"""
+    phrases = []
+    for term in (query or '').split():
+        tokens = tokenize(term)
+        if not tokens:
+            continue
+        # 英文没打完用前缀匹配；单个汉字直接匹配索引里的单字
+        prefix = not _TOKEN_RE.match(tokens[-1]).group(1)
+        phrase = '"' + ' '.join(tokens) + '"'
+        phrases.append(phrase + ('*' if prefix else ''))
+    return ' AND '.join(phrases) or None
+
+
+# ------------------- 摘要高亮 -------------------
+def _window(query: str, dialect: str = None):
+    """
+    正文里最长那个关键词第一次出现的位置前后一段（SQL 表达式），交给 make_snippet 再截取高亮
+    找位置的函数各数据库不一样：SQLite instr + 两参 max，PostgreSQL strpos + greatest；别的数据库整篇取回在 Python 里截
+    """
+    from models import Post
+    terms = sorted({t for t in (query or '').split() if t}, key=len, reverse=True)
+    if not terms:
+        return func.substr(Post.content, 1, SNIPPET_WINDOW)
+    lowered, term = func.lower(Post.content), terms[0].lower()
+    dialect = dialect or db.engine.dialect.name
+    if dialect == 'sqlite':
+        start = func.max(func.instr(lowered, term) - SNIPPET_WINDOW // 4, 1)
+    elif dialect == 'postgresql':
+        start = func.greatest(func.strpos(lowered, term) - SNIPPET_WINDOW // 4, 1)
+    else:
+        return Post.content
+    return func.substr(Post.content, start, SNIPPET_WINDOW)
+
+
+def make_snippet(value: str, query: str, width: int = 120) -> Markup:
+    """在原文里找到第一个命中的词，截取前后一段并用 <mark> 高亮"""
+    value = re.sub(r'!\[[^\]]*\]\([^)]*\)', '', value or '')
+    value = re.sub(r'\s+', ' ', value).strip()
+    terms = sorted({t for t in (query or '').split() if t}, key=len, reverse=True)
+    if not value:
+        return Markup('')
+    if not terms:
+        return escape(value[:width])
+
+    pattern = re.compile('|'.join(re.escape(t) for t in terms), re.IGNORECASE)
+    first = pattern.search(value)
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(value), start + width)
+    window = value[start:end]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(window):
+        parts.append(escape(window[last:m.start()]))
+        parts.append(Markup('<mark>%s</mark>') % m.group(0))
+        last = m.end()
+    parts.append(escape(window[last:]))
+
+    snippet = Markup('').join(parts)
+    if start > 0:
+        snippet = Markup('…') + snippet
+    if end < len(value):
+        snippet = snippet + Markup('…')
+    return snippet
+
+
+# ------------------- 索引维护 -------------------
+def _rowid(kind: str, ref_id: int) -> int:
+    return ref_id * 2 + _KIND_OFFSET[kind]
+
+
+def _post_row(post) -> dict:
+    return {
+        'rowid': _rowid(KIND_POST, post.id),
+        'kind': KIND_POST,
+        'ref_id': post.id,
+        'category': post.category.value if hasattr(post.category, 'value') else post.category,
+        'title': _index_text(post.title),
+        'body': _index_text(post.content),
+        'tags': _index_text(post.tags),
+    }
+
+
+def _taiko_row(record) -> dict:
+    return {
+        'rowid': _rowid(KIND_TAIKO, record.id),
+        'kind': KIND_TAIKO,
+        'ref_id': record.id,
+        'category': record.main_category.value if hasattr(record.main_category, 'value') else record.main_category,
+        'title': _index_text(record.name),
+        'body': _index_text(record.note),
+        'tags': _index_text(record.difficulty),
+    }
+
+
+_INSERT_SQL = text(
+    f'INSERT INTO {SEARCH_TABLE} (rowid, kind, ref_id, category, title, body, tags) '
+    f'VALUES (:rowid, :kind, :ref_id, :category, :title, :body, :tags)'
+)
+_DELETE_SQL = text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid')
+
+
+def _write(conn, upserts: list, deletes: list) -> None:
+    rowids = [{'rowid': row['rowid']} for row in upserts] + [{'rowid': r} for r in deletes]
+    if rowids:
+        conn.execute(_DELETE_SQL, rowids)
+    if upserts:
+        conn.execute(_INSERT_SQL, upserts)
+
+
+_POST_FIELDS = ('title', 'content', 'tags', 'category')
+_TAIKO_FIELDS = ('name', 'note', 'difficulty', 'main_category')
+
+
+def _changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _after_flush(session, flush_context):
+    """和业务写入同一个事务里同步索引"""
+    if not _state['enabled']:
+        return
+    from models import Post, TaikoRecord
+
+    upserts, deletes = [], []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Post) and (obj in session.new or _changed(obj, _POST_FIELDS)):
+            upserts.append(_post_row(obj))
+        elif isinstance(obj, TaikoRecord) and (obj in session.new or _changed(obj, _TAIKO_FIELDS)):
+            upserts.append(_taiko_row(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            deletes.append(_rowid(KIND_POST, obj.id))
+        elif isinstance(obj, TaikoRecord):
+            deletes.append(_rowid(KIND_TAIKO, obj.id))
+
+    if upserts or deletes:
+        _write(session.connection(), upserts, deletes)
+
+
+def create_index() -> bool:
+    """建 FTS5 虚表，成功返回 True"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+                f'kind UNINDEXED, ref_id UNINDEXED, category UNINDEXED, title, body, tags, '
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+    except Exception:  # 没有编译 FTS5
+        return False
+    return True
+
+
+def rebuild_index() -> int:
+    """清空并重建整个索引，返回写入的条数"""
+    from models import Post, TaikoRecord
+
+    conn = db.session.connection()
+    conn.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+    total = 0
+    batch = []
+    for model, to_row in ((Post, _post_row), (TaikoRecord, _taiko_row)):
+        for obj in model.query.order_by(model.id).yield_per(500):
+            batch.append(to_row(obj))
+            if len(batch) >= 500:
+                _write(conn, batch, [])
+                total += len(batch)
+                batch = []
+    if batch:
+        _write(conn, batch, [])
+        total += len(batch)
+    db.session.commit()
+    return total
+
+
+def index_taiko(conn, records) -> None:
+    """绕过 ORM 批量写入的战绩（批量导入）在同一个连接里补进索引；records 只需有 id/name/note/difficulty/main_category"""
+    if _state['enabled'] and records:
+        _write(conn, [_taiko_row(record) for record in records], [])
+
+
+def is_enabled() -> bool:
+    return _state['enabled']
+
+
+# ------------------- 查询 -------------------
+def search(query: str, kind: str = None, category: str = None, limit: int = SEARCH_LIMIT,
+           seek=None, reverse: bool = False) -> list:
+    """
+    返回按 bm25 排序的 SearchHit 列表（越相关越靠前）
+    seek: (rank, rowid) 游标，只返回排在它之后的结果；reverse=True 时往前翻
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    inner = (
+        f'SELECT kind, ref_id, rowid AS rid, bm25({SEARCH_TABLE}, {_BM25_WEIGHTS}) AS rank '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match'
+    )
+    params = {'match': match, 'limit': limit}
+    if kind:
+        inner += ' AND kind = :kind'
+        params['kind'] = kind
+    if category:
+        inner += ' AND category = :category'
+        params['category'] = category
+
+    sql = f'SELECT kind, ref_id, rid, rank FROM ({inner})'
+    op, direction = ('<', 'DESC') if reverse else ('>', 'ASC')
+    if seek is not None:
+        sql += f' WHERE rank {op} :rank OR (rank = :rank AND rid {op} :rid)'
+        params['rank'], params['rid'] = seek
+    sql += f' ORDER BY rank {direction}, rid {direction} LIMIT :limit'
+    rows = db.session.execute(text(sql), params).all()
+    return [SearchHit(row.kind, int(row.ref_id), row.rank, row.rid) for row in rows]
+
+
+def match_post_ids(query: str):
+    """
+    命中的文章 id（子查询，不限条数，给 Post.id.in_() 用）；FTS5 不可用时返回 None（调用方退回 LIKE）
+    用在后台筛选、导出这类要全部结果的地方，不像 search() 那样只取相关度最高的一批
+    """
+    if not _state['enabled']:
+        return None
+    match = build_match_query(query)
+    if not match:
+        return []
+    return (text(f'SELECT ref_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match AND kind = :kind')
+            .bindparams(match=match, kind=KIND_POST)
+            .columns(ref_id=Integer))
+
+
+def _hydrate(query, model, hits) -> list:
+    ids = [hit.ref_id for hit in hits]
+    if not ids:
+        return []
+    objects = {obj.id: obj for obj in query.filter(model.id.in_(ids)).all()}
+    return [objects[i] for i in ids if i in objects]
+
+
+_SEEK_TYPES = (float, int)  # 搜索游标：(bm25 rank, rowid)
+
+
+def _search_page(model, kind, query, category, prefix, base_query) -> Page:
+    """按 (rank, rowid) 做游标分页；base_query 决定加载哪些列（见 loading）"""
+    per_page = get_per_page()
+    after = decode_cursor(request.args.get(f'{prefix}after'), _SEEK_TYPES)
+    before = decode_cursor(request.args.get(f'{prefix}before'), _SEEK_TYPES)
+    reverse = before is not None and after is None
+    seek = before if reverse else after
+
+    hits = search(query, kind=kind, category=category, limit=per_page + 1, seek=seek, reverse=reverse)
+    has_more = len(hits) > per_page
+    hits = hits[:per_page]
+    if reverse:
+        hits.reverse()
+
+    more_after, more_before = (seek is not None, has_more) if reverse else (has_more, seek is not None)
+    next_cursor = encode_cursor([hits[-1].rank, hits[-1].rowid]) if hits and more_after else None
+    prev_cursor = encode_cursor([hits[0].rank, hits[0].rowid]) if hits and more_before else None
+    return Page(_hydrate(base_query, model, hits), next_cursor, prev_cursor, prefix)
+
+
+def search_posts(query: str, category: str = None, prefix: str = ''):
+    """搜索文章，返回 (分页结果, {post_id: 高亮摘要})，按相关度排序"""
+    import loading
+    from models import Post
+
+    # 列表只取卡片列 + 正文里命中位置附近的一段（SQL 里截），不把整篇正文读进来
+    posts = loading.apply(Post.query, 'post_card').options(with_expression(Post.search_window, _window(query)))
+    if _state['enabled']:
+        page = _search_page(Post, KIND_POST, query, category, prefix, posts)
+    else:
+        posts = posts.filter(Post.title.contains(query) | Post.content.contains(query))
+        if category:
+            posts = posts.filter_by(category=category)
+        page = paginate(posts, [Key(Post.created_at), Key(Post.id)], prefix=prefix)
+    return page, {post.id: make_snippet(post.search_window, query) for post in page}
+
+
+def search_taiko(query: str, prefix: str = 'records_'):
+    """搜索太鼓战绩，返回 (分页结果, {record_id: 高亮摘要})"""
+    import loading
+    from models import TaikoRecord
+
+    records = loading.apply(TaikoRecord.query, 'taiko_card')
+    if _state['enabled']:
+        page = _search_page(TaikoRecord, KIND_TAIKO, query, None, prefix, records)
+    else:
+        records = records.filter(TaikoRecord.name.contains(query) | TaikoRecord.note.contains(query))
+        page = paginate(records, [Key(TaikoRecord.played_at), Key(TaikoRecord.id)], prefix=prefix)
+    return page, {record.id: make_snippet(record.note or record.name, query) for record in page}
+
+
+def init_app(app):
+    """建索引表、挂写入同步钩子、注册重建命令"""
+    with app.app_context():
+        _state['enabled'] = create_index()
+        if _state['enabled']:
+            from models import CacheVersion, Post, TaikoRecord
+            indexed = db.session.execute(text(f'SELECT count(*) FROM {SEARCH_TABLE}')).scalar()
+            stale = CacheVersion.current(INDEX_VERSION_KEY) < INDEX_VERSION
+            missing = not indexed and (db.session.query(Post.id).first() or db.session.query(TaikoRecord.id).first())
+            if stale or missing:
+                rebuild_index()  # 空表也没关系，重建完才记版本号
+                db.session.merge(CacheVersion(name=INDEX_VERSION_KEY, version=INDEX_VERSION))
+                db.session.commit()
+            db.session.remove()
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+    @app.cli.command('search-reindex')
+    def search_reindex_command():
+        """重建全文检索索引"""
+        if not _state['enabled']:
+            click.echo('[SEARCH] 当前数据库不支持 FTS5，搜索会退回 LIKE')
+            return
+        total = rebuild_index()
+        click.echo(f'[SEARCH] 索引重建完成，共 {total} 条')
@@ -0,0 +1,124 @@
+# site_context.py —— base.html 全局变量的缓存层（按需加载 + 版本号失效）
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import g
+from werkzeug.local import LocalProxy
+
+SITE_CONTEXT_VERSION = 'site_context'
+
+SETTINGS_FIELDS = ('site_title', 'site_subtitle', 'site_description', 'site_motto', 'footer_text')
+
+# 每个 worker 一份：{'version': int, 'values': {name: value}}
+_cache = {'version': None, 'values': {}}
+_lock = threading.Lock()
+
+
+def snapshot(obj, fields=None) -> SimpleNamespace:
+    """把 ORM 对象的列拷成普通对象，跨请求缓存不会碰到 detached/expired；fields 只拷这几列（配合 load_only）"""
+    names = fields or [col.name for col in obj.__table__.columns]
+    return SimpleNamespace(**{name: getattr(obj, name) for name in names})
+
+
+def bump_site_context() -> None:
+    """内容变动后调用（在 commit 之前），所有 worker 下次读取时重新加载"""
+    from models import CacheVersion
+    CacheVersion.bump(SITE_CONTEXT_VERSION)
+    with _lock:
+        _cache['version'] = None
+        _cache['values'] = {}
+
+
+def _current_version() -> int:
+    # 一个请求里只查一次版本号
+    if 'site_context_version' not in g:
+        from models import CacheVersion
+        g.site_context_version = CacheVersion.current(SITE_CONTEXT_VERSION)
+    return g.site_context_version
+
+
+def _get(name: str, loader):
+    version = _current_version()
+    with _lock:
+        if _cache['version'] != version:
+            _cache['version'] = version
+            _cache['values'] = {}
+        values = _cache['values']
+        if name not in values:
+            values[name] = loader()
+        return values[name]
+
+
+# ------------------- 各个加载函数 -------------------
+def _load_settings() -> dict:
+    from models import SiteSettings
+    settings = SiteSettings.query.first() or SiteSettings()
+    return {field: getattr(settings, field) for field in SETTINGS_FIELDS}
+
+
+def _load_latest_posts() -> list:
+    import loading
+    from models import Post
+    posts = loading.apply(Post.query, 'post_card').order_by(Post.created_at.desc()).limit(6).all()
+    return [snapshot(post, loading.POST_CARD_COLUMNS) for post in posts]
+
+
+def _load_recent_taiko() -> list:
+    from models import TaikoRecord
+    records = TaikoRecord.query.order_by(TaikoRecord.played_at.desc()).limit(10).all()
+    return [snapshot(record) for record in records]
+
+
+def _load_taiko_summary() -> SimpleNamespace:
+    """首页的战绩汇总：读物化好的玩家统计（几行），不扫战绩表"""
+    from sqlalchemy import func
+    from extensions import db
+    from models import TaikoPlayerStats as stats
+    row = db.session.query(
+        func.coalesce(func.sum(stats.record_count), 0),
+        func.coalesce(func.sum(stats.song_count), 0),
+        func.coalesce(func.sum(stats.dan_count), 0),
+        func.max(stats.best_score),
+        func.coalesce(func.max(stats.best_accuracy), 0.0),
+        func.coalesce(func.sum(stats.full_combo_count), 0),
+        func.coalesce(func.sum(stats.rainbow_count), 0),
+    ).one()
+    fields = ('record_count', 'song_count', 'dan_count', 'best_score', 'best_accuracy',
+              'full_combo_count', 'rainbow_count')
+    return SimpleNamespace(**dict(zip(fields, row)))
+
+
+def get_settings() -> dict:
+    return _get('settings', _load_settings)
+
+
+def get_latest_posts() -> list:
+    return _get('latest_posts', _load_latest_posts)
+
+
+def get_recent_taiko() -> list:
+    return _get('recent_taiko', _load_recent_taiko)
+
+
+def get_taiko_summary() -> SimpleNamespace:
+    return _get('taiko_summary', _load_taiko_summary)
+
+
+def _setting(field: str) -> LocalProxy:
+    return LocalProxy(lambda: get_settings()[field])
+
+
+def init_app(app):
+    """注册全局上下文处理器：模板真正读到变量时才查库"""
+
+    @app.context_processor
+    def inject_global_vars():
+        context = {field: _setting(field) for field in SETTINGS_FIELDS}
+        context.update({
+            'current_year': datetime.now().year,
+            'latest_posts': LocalProxy(get_latest_posts),
+            'recent_taiko': LocalProxy(get_recent_taiko),
+            'taiko_summary': LocalProxy(get_taiko_summary),
+        })
+        return context
@@ -0,0 +1,163 @@
+# sql_profiler.py —— 每个请求的 SQL 统计：条数、总耗时、最慢的几条、重复语句（疑似 N+1）
+# 挂在 SQLAlchemy 的 cursor 执行事件上；按 endpoint 汇总到进程内，后台 /admin/sql 查看。
+# 注意：gunicorn 多 worker 时汇总只是当前 worker 的，发现 N+1 时会额外写一条 WARNING 日志（所有 worker 共用 app.log）。
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULTS = {
+    'SQL_PROFILE': True,                 # 总开关
+    'SQL_PROFILE_HEADERS': None,         # 响应头输出统计，None = 跟随 app.debug
+    'SQL_N_PLUS_ONE_THRESHOLD': 5,       # 同一条语句一个请求里执行几次算疑似 N+1
+    'SQL_SLOWEST_KEEP': 5,               # 每个请求/endpoint 保留最慢的几条
+}
+
+# 没匹配到路由的请求（404、扫描器）都记在这一个键下，不按路径分，否则每个乱七八糟的 URL 都会多一条统计
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+class RequestStats:
+    """单个请求内的 SQL 统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.statements = Counter()
+        self.slowest = []  # [(耗时, 语句)]
+
+    def add(self, statement: str, elapsed: float, keep: int):
+        self.count += 1
+        self.total += elapsed
+        self.statements[statement] += 1
+        if len(self.slowest) < keep or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[keep:]
+
+    def suspects(self, threshold: int) -> list:
+        """[(语句, 次数)]：同一条参数化语句重复执行，多半是模板里循环触发的懒加载"""
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+
+class EndpointStats:
+    """某个 endpoint 的累计统计（当前进程）"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.queries = 0
+        self.total = 0.0
+        self.max_queries = 0
+        self.slowest = []
+        self.suspects = Counter()  # 语句 -> 被判为 N+1 的请求数
+
+    @property
+    def avg_queries(self) -> float:
+        return self.queries / self.requests if self.requests else 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total * 1000 / self.requests if self.requests else 0.0
+
+
+class SQLProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._reported = set()  # 已经写过日志的 (endpoint, 语句)，避免刷屏
+        self.started_at = time.time()
+
+    # ------------------- 引擎事件 -------------------
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('sql_profiler_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('sql_profiler_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if not has_request_context():
+            return
+        stats = g.get('sql_stats')
+        if stats is None:
+            return
+        stats.add(' '.join(statement.split()), elapsed, g.sql_profile_keep)
+
+    # ------------------- 请求钩子 -------------------
+    def _start_request(self):
+        from flask import current_app
+        if current_app.config['SQL_PROFILE'] and request.endpoint != 'static':
+            g.sql_stats = RequestStats()
+            g.sql_profile_keep = current_app.config['SQL_SLOWEST_KEEP']
+
+    def _finish_request(self, response):
+        from flask import current_app
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        config = current_app.config
+        suspects = stats.suspects(config['SQL_N_PLUS_ONE_THRESHOLD'])
+        self._record(request.endpoint or UNMATCHED_ENDPOINT, stats, suspects, config['SQL_SLOWEST_KEEP'])
+
+        show_headers = config['SQL_PROFILE_HEADERS']
+        if show_headers is None:
+            show_headers = current_app.debug
+        if show_headers:
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Time-ms'] = f'{stats.total * 1000:.2f}'
+            if suspects:
+                response.headers['X-DB-N-Plus-One'] = '; '.join(
+                    f'{n}x {stmt[:120]}' for stmt, n in suspects[:3])
+        return response
+
+    def _record(self, endpoint, stats, suspects, keep):
+        new_suspects = []
+        with self._lock:
+            ep = self._endpoints.get(endpoint)
+            if ep is None:
+                ep = self._endpoints[endpoint] = EndpointStats(endpoint)
+            ep.requests += 1
+            ep.queries += stats.count
+            ep.total += stats.total
+            ep.max_queries = max(ep.max_queries, stats.count)
+            ep.slowest = sorted(ep.slowest + stats.slowest, key=lambda item: item[0], reverse=True)[:keep]
+            for stmt, n in suspects:
+                ep.suspects[stmt] += 1
+                if (endpoint, stmt) not in self._reported:
+                    self._reported.add((endpoint, stmt))
+                    new_suspects.append((stmt, n))
+        if new_suspects:
+            from flask import current_app
+            for stmt, n in new_suspects:
+                current_app.logger.warning(f'疑似 N+1：{endpoint} 一次请求执行 {n} 次: {stmt[:300]}')
+
+    # ------------------- 报表 -------------------
+    def report(self) -> list:
+        """按总耗时倒序的 endpoint 统计快照"""
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        return sorted(endpoints, key=lambda ep: ep.total, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._reported.clear()
+            self.started_at = time.time()
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        # 挂在 Engine 类上，对所有引擎生效；create_app 被调多次时只挂一次
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+
+sql_profiler = SQLProfiler()
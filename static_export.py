@@ -0,0 +1,195 @@
+# static_export.py —— 公开页面导出成静态 HTML：nginx 直接发文件，gunicorn 只处理后台、登录、评论
+# 增量：每个页面的“版本”就是 conditional_get 的 ETag（数据版本 + 模板部署时间），和上次导出一样就跳过。
+# 后台改了内容时（page_cache 按标签失效），对应的静态文件直接删掉，nginx 找不到文件就回落到 gunicorn，下次导出再补上。
+# 静态页面不经过 Flask，文章浏览量只统计走到 gunicorn 的请求。
+import json
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app, url_for
+
+import conditional_get
+from extensions import db
+from page_cache import page_cache, tags_for
+
+DEFAULTS = {
+    'STATIC_EXPORT_DIR': None,   # 默认 <项目>/static_site，nginx 的 root 指向这里
+}
+MANIFEST = '.manifest.json'
+
+# 每个页面用哪个版本函数（about 只跟站点设置走）
+VALIDATORS = {
+    'index': conditional_get.index_validator,
+    'about': conditional_get.index_validator,
+    'archive.archive': conditional_get.archive_validator,
+    'taiko_page': conditional_get.taiko_list_validator,
+    'taiko_detail': conditional_get.taiko_record_validator,
+    'post_detail': conditional_get.post_validator,
+}
+
+# 导出时渲染页面要关掉的东西：不走整页缓存、不算浏览、不记 SQL 统计
+RENDER_CONFIG = {
+    'PAGE_CACHE': False,
+    'VIEW_COUNT': False,
+    'SQL_PROFILE': False,
+    'CONDITIONAL_GET': False,
+}
+
+Page = namedtuple('Page', 'url endpoint view_args file')
+
+_worker = {}
+
+
+def output_dir(app) -> str:
+    return app.config['STATIC_EXPORT_DIR'] or os.path.join(app.root_path, 'static_site')
+
+
+def file_for(url: str) -> str:
+    """/ -> index.html，/post/5 -> post/5/index.html，/archive/archive?category=TECH -> archive/archive/q/category=TECH.html"""
+    path, _, query = url.partition('?')
+    base = path.strip('/')
+    if query:
+        return os.path.join(base, 'q', f'{query}.html')
+    return os.path.join(base, 'index.html')
+
+
+def site_pages() -> list:
+    """要导出的全部页面（需要 app 上下文）"""
+    from models import Category, Post, TaikoRecord
+    targets = [('index', {}, {}), ('about', {}, {}), ('archive.archive', {}, {}), ('taiko_page', {}, {})]
+    targets += [('archive.archive', {}, {'category': category.value}) for category in Category]
+    targets += [('post_detail', {'post_id': post_id}, {}) for (post_id,) in db.session.query(Post.id)]
+    targets += [('taiko_detail', {'record_id': record_id}, {}) for (record_id,) in db.session.query(TaikoRecord.id)]
+
+    pages = []
+    with current_app.test_request_context():
+        for endpoint, view_args, query in targets:
+            url = url_for(endpoint, **view_args, **query)
+            pages.append(Page(url, endpoint, view_args, file_for(url)))
+    return pages
+
+
+def read_manifest(root: str) -> dict:
+    """{url: {'etag': ..., 'file': ..., 'tags': [...]}}"""
+    try:
+        with open(os.path.join(root, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# ------------------- 渲染（可以放进进程池） -------------------
+def _setup_worker(app=None):
+    """进程池里每个进程自己建一个 app；单进程时直接用当前 app"""
+    if app is None:
+        from app import create_app
+        app = create_app()
+    app.config.update(RENDER_CONFIG)
+    _worker['app'] = app
+    _worker['client'] = app.test_client()
+
+
+def export_page(page: Page, previous: str, root: str, force: bool = False):
+    """版本没变且文件还在就跳过，否则按匿名访客渲染一遍写进去；返回 (url, etag, 结果)"""
+    app, client = _worker['app'], _worker['client']
+    path = os.path.join(root, page.file)
+    with app.app_context():
+        values = VALIDATORS[page.endpoint](**page.view_args)
+        db.session.remove()
+    if values is None:
+        return page.url, None, 'missing'
+    etag = conditional_get.make_etag(values)
+    if not force and etag == previous and os.path.exists(path):
+        return page.url, etag, 'unchanged'
+
+    response = client.get(page.url)
+    if response.status_code != 200:
+        return page.url, None, 'failed'
+    _write_atomic(path, response.get_data())
+    return page.url, etag, 'rendered'
+
+
+# ------------------- 导出 -------------------
+def export_site(root: str, workers: int = 1, force: bool = False) -> Counter:
+    """增量导出到 root，返回各结果的计数；manifest 最后一次性写"""
+    app = current_app._get_current_object()
+    pages = site_pages()
+    manifest = {} if force else read_manifest(root)
+    db.session.remove()
+
+    jobs = [(page, manifest.get(page.url, {}).get('etag'), root, force) for page in pages]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+            results = list(pool.map(export_page, *zip(*jobs), chunksize=max(1, len(jobs) // (workers * 8))))
+    else:
+        _setup_worker(app)
+        results = [export_page(*job) for job in jobs]
+
+    summary = Counter()
+    by_url = {page.url: page for page in pages}
+    new_manifest = {}
+    for url, etag, status in results:
+        summary[status] += 1
+        page = by_url[url]
+        if etag is None:
+            _remove(os.path.join(root, page.file))  # 渲染失败或内容已删：交给 gunicorn
+            continue
+        new_manifest[url] = {'etag': etag, 'file': page.file,
+                             'tags': tags_for(page.endpoint, page.view_args)}
+
+    # 已经不存在的页面（文章被删了等）
+    for url, entry in manifest.items():
+        if url not in by_url and _remove(os.path.join(root, entry['file'])):
+            summary['removed'] += 1
+
+    _write_atomic(os.path.join(root, MANIFEST), json.dumps(new_manifest, ensure_ascii=False).encode('utf-8'))
+    return summary
+
+
+def discard(tags) -> int:
+    """page_cache 失效时调用：删掉带这些标签的静态文件（tags 为 None 全删），manifest 不动，下次导出补回"""
+    root = output_dir(current_app)
+    manifest = read_manifest(root)
+    removed = 0
+    for entry in manifest.values():
+        if tags is None or set(tags) & set(entry['tags']):
+            removed += _remove(os.path.join(root, entry['file']))
+    return removed
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    page_cache.on_invalidate(discard)
+
+    @app.cli.command('export-static')
+    @click.option('--output', type=click.Path(file_okay=False), help='输出目录（默认 STATIC_EXPORT_DIR）')
+    @click.option('--workers', type=int, default=os.cpu_count(), help='渲染进程数，1 = 不开进程池')
+    @click.option('--full', is_flag=True, help='忽略上次的版本，全部重新渲染')
+    def export_static_command(output, workers, full):
+        """把首页、关于、归档（含分类）、太鼓列表、全部文章和战绩详情导出成静态 HTML"""
+        root = output or output_dir(app)
+        started = time.perf_counter()
+        summary = export_site(root, workers=max(1, workers), force=full)
+        click.echo(f'[EXPORT] {root}：渲染 {summary["rendered"]}，未变 {summary["unchanged"]}，'
+                   f'删除 {summary["removed"]}，失败 {summary["failed"] + summary["missing"]}，'
+                   f'用时 {time.perf_counter() - started:.1f}s')
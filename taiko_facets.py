@@ -0,0 +1,97 @@
+# taiko_facets.py —— 太鼓战绩页的分面筛选：列表按筛选条件走复合索引分页，
+# 各下拉框每个选项的条数由一条 GROUP BY（主类别、子类别、难度、冠）算出来：
+# 结果行数只跟组合数有关（几十行），和战绩表多大无关，在 Python 里按“其它筛选条件”求和即可，
+# 不用每个选项各发一条 COUNT。
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from extensions import db
+
+Facet = namedtuple('Facet', 'name label all_label options')              # options: [(值, 显示名)]
+FacetOption = namedtuple('FacetOption', 'value label count selected')
+FacetGroup = namedtuple('FacetGroup', 'name label all_label total options')
+
+FACETS = (
+    Facet('main_category', '主类别', '所有类型', (('DAN', '段位'), ('SONG', '歌曲'))),
+    Facet('sub_category', '子类别', '所有子类别', (('BRUSH_SCORE', '刷分'), ('FULL_COMBO', '全连'), ('GOOD_OK', '全良'))),
+    # 难度是自由填写的，这里只定顺序，数据里有的其它难度排在后面
+    Facet('difficulty', '难度', '所有难度', (('鬼', '鬼'), ('裏鬼', '裏鬼'))),
+    Facet('crown', '冠', '所有冠', (('CLEAR', '普通通关'), ('SILVER_FC', '银冠'), ('GOLD_FC', '金冠'), ('RAINBOW_FC', '虹冠'))),
+)
+FACET_NAMES = tuple(facet.name for facet in FACETS)
+
+
+def _value(value):
+    return getattr(value, 'value', value)
+
+
+def parse_filters(args) -> dict:
+    """请求参数 -> {分面: 值}；空值忽略，旧链接里的中文显示名也认"""
+    filters = {}
+    for facet in FACETS:
+        raw = (args.get(facet.name) or '').strip()
+        if not raw:
+            continue
+        labels = {label: value for value, label in facet.options}
+        values = {value for value, _ in facet.options}
+        if raw in values:
+            filters[facet.name] = raw
+        elif raw in labels:
+            filters[facet.name] = labels[raw]
+        elif facet.name == 'difficulty':
+            filters[facet.name] = raw
+    return filters
+
+
+def filtered_query(filters: dict):
+    """按筛选条件过滤的战绩查询（排序交给分页）"""
+    from models import TaikoRecord
+    query = TaikoRecord.query
+    for name, value in filters.items():
+        query = query.filter(getattr(TaikoRecord, name) == value)
+    return query
+
+
+def combination_counts() -> list:
+    """[(主类别, 子类别, 难度, 冠, 条数)]，一条查询，走 ix_taiko_record_facets 覆盖索引"""
+    from models import TaikoRecord
+    columns = [getattr(TaikoRecord, name) for name in FACET_NAMES]
+    rows = db.session.query(*columns, func.count()).group_by(*columns).all()
+    return [tuple(_value(v) for v in row[:-1]) + (row[-1],) for row in rows]
+
+
+def facet_groups(filters: dict, combos: list = None) -> tuple:
+    """
+    返回 ([FacetGroup], 当前条件下的总数)
+    每个分面的条数按“除了它自己以外的筛选条件”来算，选了某个选项后同一个下拉框里的其它选项照样有数字
+    """
+    if combos is None:
+        combos = combination_counts()
+    positions = {name: i for i, name in enumerate(FACET_NAMES)}
+
+    def matches(row, skip=None):
+        return all(row[positions[name]] == value for name, value in filters.items() if name != skip)
+
+    groups = []
+    for facet in FACETS:
+        i = positions[facet.name]
+        counts = {}
+        total = 0
+        for row in combos:
+            if matches(row, skip=facet.name):
+                total += row[-1]
+                if row[i] is not None:
+                    counts[row[i]] = counts.get(row[i], 0) + row[-1]
+        known = [value for value, _ in facet.options]
+        labels = dict(facet.options)
+        extra = sorted(value for value in counts if value not in labels)
+        selected = filters.get(facet.name)
+        if selected is not None and selected not in known and selected not in extra:
+            extra.append(selected)
+        options = [FacetOption(value, labels.get(value, value), counts.get(value, 0), value == selected)
+                   for value in known + extra]
+        groups.append(FacetGroup(facet.name, facet.label, facet.all_label, total, options))
+
+    total = sum(row[-1] for row in combos if matches(row))
+    return groups, total
@@ -0,0 +1,332 @@
+# taiko_import.py —— 太鼓战绩批量导入（CSV / JSON 数组 / JSON Lines）
+# 边读边解析（文件不整个读进内存），逐行按枚举校验，按 (玩家, 曲名, 难度, 游玩时间) 去重，
+# 每批一个事务、一条 executemany 插入；太鼓统计和全文索引在同一个事务里跟着更新。
+import codecs
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import click
+from sqlalchemy import select
+
+from extensions import db
+
+FORMATS = ('csv', 'json', 'jsonl')
+BATCH_SIZE = 500
+MAX_ERRORS = 50         # 报告里最多列这么多条错误（计数照常）
+_READ_SIZE = 64 * 1024
+
+FIELDS = ('player', 'main_category', 'sub_category', 'name', 'difficulty', 'score', 'good', 'ok', 'bad',
+          'crown', 'played_at', 'note')
+
+
+class ImportReport:
+    """导入结果：读了多少行、插入多少、重复多少、不合格多少（附前 MAX_ERRORS 条原因）"""
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []  # [(行号, 原因)]
+        self.players = set()
+
+    def error(self, line: int, message: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'读取 {self.read} 行，导入 {self.inserted}，重复 {self.duplicates}，无效 {self.invalid}'
+
+
+def detect_format(filename: str):
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    return ext if ext in FORMATS else None
+
+
+# ------------------- 流式读取 -------------------
+def _iter_json_array(reader):
+    """JSON 数组逐个对象解码（只缓冲当前这一个对象），行号记成对象序号"""
+    decoder = json.JSONDecoder()
+    buffer = reader.read(_READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('JSON 文件应当是对象数组')
+    buffer = buffer[1:]
+    index = 0
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        while not buffer:
+            chunk = reader.read(_READ_SIZE)
+            if not chunk:
+                raise ValueError('JSON 数组没有结束')
+            buffer = chunk.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer)
+                break
+            except json.JSONDecodeError:
+                chunk = reader.read(_READ_SIZE)
+                if not chunk:
+                    raise
+                buffer += chunk
+        index += 1
+        yield index, item
+        buffer = buffer[end:]
+
+
+def iter_rows(fileobj, fmt: str):
+    """二进制文件对象 -> (行号, dict)；UTF-8（带不带 BOM 都行）"""
+    reader = codecs.getreader('utf-8-sig')(fileobj)
+    if fmt == 'csv':
+        rows = csv.DictReader(reader)
+        for row in rows:
+            yield rows.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(reader, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e  # 坏行交给校验那一步记错误，不中断整个文件
+    elif fmt == 'json':
+        yield from _iter_json_array(reader)
+    else:
+        raise ValueError(f'不支持的格式：{fmt}')
+
+
+# ------------------- 校验 -------------------
+def _enum_labels() -> dict:
+    """分面里的中文显示名也认（和筛选下拉框一致）"""
+    from taiko_facets import FACETS
+    return {facet.name: {label: value for value, label in facet.options} for facet in FACETS}
+
+
+def _enum(enum_cls, raw, field: str, labels: dict):
+    if raw is None or str(raw).strip() == '':
+        return None
+    text = str(raw).strip()
+    try:
+        return enum_cls(labels.get(text, text).upper())
+    except ValueError:
+        raise ValueError(f'{field} 不合法：{text}（可选 {"/".join(m.value for m in enum_cls)}）') from None
+
+
+def _int(raw, field: str, default=None):
+    if raw is None or str(raw).strip() == '':
+        return default
+    try:
+        value = int(str(raw).replace(',', '').strip())
+    except ValueError:
+        raise ValueError(f'{field} 应当是整数：{raw}') from None
+    if value < 0:
+        raise ValueError(f'{field} 不能是负数：{raw}')
+    return value
+
+
+def _datetime(raw) -> datetime:
+    """ISO 8601 字符串或 Unix 时间戳；带时区的换算成 UTC（库里存的都是 UTC）"""
+    if raw is None or str(raw).strip() == '':
+        raise ValueError('缺少 played_at')
+    if isinstance(raw, (int, float)) or str(raw).strip().isdigit():
+        return datetime.utcfromtimestamp(float(raw))
+    try:
+        value = datetime.fromisoformat(str(raw).strip())
+    except ValueError:
+        raise ValueError(f'played_at 格式不对：{raw}') from None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _Players:
+    """用户名 -> id（查过的记住）；没有 player 列时用默认玩家"""
+
+    def __init__(self, default):
+        self.default_id = default.id
+        self._ids = {default.username: default.id}
+
+    def get(self, username) -> int:
+        username = str(username or '').strip()
+        if not username:
+            return self.default_id
+        if username not in self._ids:
+            from models import User
+            self._ids[username] = db.session.query(User.id).filter_by(username=username).scalar()
+        if self._ids[username] is None:
+            raise ValueError(f'没有这个用户：{username}')
+        return self._ids[username]
+
+
+def parse_row(raw, players: _Players, labels: dict) -> dict:
+    """一行原始数据 -> taiko_record 的列（和 TaikoRecord.__init__ 的默认值一致），不合格抛 ValueError"""
+    from models import CrownType, TaikoMainCategory, TaikoSubCategory
+    if isinstance(raw, Exception):
+        raise ValueError(f'JSON 解析失败：{raw}')
+    if not isinstance(raw, dict):
+        raise ValueError('每条记录应当是一个对象')
+
+    main_category = _enum(TaikoMainCategory, raw.get('main_category'), 'main_category', labels['main_category'])
+    if main_category is None:
+        raise ValueError('缺少 main_category')
+    name = str(raw.get('name') or '').strip()
+    if not name:
+        raise ValueError('缺少 name')
+    if len(name) > 150:
+        raise ValueError('name 超过 150 个字符')
+
+    row = {
+        'main_category': main_category,
+        'name': name,
+        'player_id': players.get(raw.get('player')),
+        'played_at': _datetime(raw.get('played_at')),
+        'note': str(raw.get('note') or ''),
+        'screenshot': None,
+        'sub_category': None,
+        'difficulty': None,
+        'score': None,
+        'good': 0,
+        'ok': 0,
+        'bad': 0,
+        'crown': CrownType.CLEAR,
+    }
+    if main_category == TaikoMainCategory.SONG:
+        difficulty = str(raw.get('difficulty') or '').strip() or None
+        if difficulty and len(difficulty) > 20:
+            raise ValueError('difficulty 超过 20 个字符')
+        row.update(
+            sub_category=_enum(TaikoSubCategory, raw.get('sub_category'), 'sub_category', labels['sub_category'])
+            or TaikoSubCategory.BRUSH_SCORE,
+            difficulty=difficulty,
+            score=_int(raw.get('score'), 'score'),
+            good=_int(raw.get('good'), 'good', 0),
+            ok=_int(raw.get('ok'), 'ok', 0),
+            bad=_int(raw.get('bad'), 'bad', 0),
+            crown=_enum(CrownType, raw.get('crown'), 'crown', labels['crown']) or CrownType.CLEAR,
+        )
+    return row
+
+
+def _key(row: dict) -> tuple:
+    return row['player_id'], row['name'], row['difficulty'] or '', row['played_at']
+
+
+# ------------------- 写入 -------------------
+def _existing_keys(conn, batch: list) -> set:
+    """库里已有的键（走 ix_taiko_record_player_played）"""
+    from models import TaikoRecord
+    table = TaikoRecord.__table__
+    rows = conn.execute(
+        select(table.c.player_id, table.c.name, table.c.difficulty, table.c.played_at)
+        .where(table.c.player_id.in_({row['player_id'] for row in batch}),
+               table.c.played_at.in_({row['played_at'] for row in batch}))
+    )
+    return {(player_id, name, difficulty or '', played_at) for player_id, name, difficulty, played_at in rows}
+
+
+def _write_batch(batch: list, report: ImportReport) -> None:
+    """一批一个事务：去掉库里已有的，executemany 插入，统计和索引跟着更新"""
+    import search_index
+    import taiko_stats
+    from models import TaikoRecord
+
+    table = TaikoRecord.__table__
+    conn = db.session.connection()
+    existing = _existing_keys(conn, batch)
+    rows = [row for row in batch if _key(row) not in existing]
+    report.duplicates += len(batch) - len(rows)
+    if rows:
+        ids = conn.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+        records = [SimpleNamespace(id=record_id, **row) for record_id, row in zip(ids, rows)]
+        taiko_stats.apply_new(conn, [taiko_stats.to_play(record) for record in records])
+        search_index.index_taiko(conn, records)
+        report.inserted += len(rows)
+        report.players.update(row['player_id'] for row in rows)
+    db.session.commit()
+
+
+def import_rows(rows, player, batch_size: int = BATCH_SIZE, progress=None) -> ImportReport:
+    """
+    rows: (行号, 原始 dict) 的可迭代对象（iter_rows 的输出）
+    player: 没有 player 列时记到谁名下
+    progress(report)：每写完一批调用一次
+    中途抛异常时已提交的批次保留，站点上下文和整页缓存（含静态导出）照样失效
+    """
+    from page_cache import page_cache
+    from site_context import bump_site_context
+
+    report = ImportReport()
+    players = _Players(player)
+    labels = _enum_labels()
+    seen = set()  # 文件内部的重复
+    batch = []
+    try:
+        for line, raw in rows:
+            report.read += 1
+            try:
+                row = parse_row(raw, players, labels)
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            key = _key(row)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _write_batch(batch, report)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _write_batch(batch, report)
+            if progress:
+                progress(report)
+    finally:
+        # 每批单独提交：中途解析失败（异常往外抛）时前面的批次已经落库，缓存照样要失效
+        if report.inserted:
+            db.session.rollback()  # 丢掉出错那一批没提交的部分
+            bump_site_context()
+            db.session.commit()
+            page_cache.invalidate('taiko')
+    return report
+
+
+def _default_player():
+    from models import User
+    return User.query.filter_by(is_admin=True).order_by(User.id).first()
+
+
+def init_app(app):
+    @app.cli.command('taiko-import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--player', help='没有 player 列的记录记到这个用户名下（默认第一个管理员）')
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='文件格式（默认按扩展名）')
+    @click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True, help='每个事务插入多少条')
+    def taiko_import_command(path, player, fmt, batch_size):
+        """从 CSV / JSON / JSON Lines 批量导入太鼓战绩"""
+        from models import User
+        fmt = fmt or detect_format(path)
+        if fmt is None:
+            raise click.ClickException('无法从扩展名判断格式，请用 --format 指定')
+        owner = User.query.filter_by(username=player).first() if player else _default_player()
+        if owner is None:
+            raise click.ClickException(f'找不到用户：{player or "（没有管理员）"}')
+
+        total = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            def progress(report):
+                click.echo(f'[IMPORT] {f.tell() * 100 // max(total, 1)}% {report}')
+            try:
+                report = import_rows(iter_rows(f, fmt), owner, batch_size=max(1, batch_size), progress=progress)
+            except (ValueError, csv.Error) as e:
+                raise click.ClickException(f'文件解析失败：{e}')
+        for line, message in report.errors:
+            click.echo(f'[IMPORT] 第 {line} 行：{message}')
+        click.echo(f'[IMPORT] 完成：{report}')
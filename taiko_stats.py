@@ -0,0 +1,231 @@
+# taiko_stats.py —— 太鼓战绩的物化统计：每个玩家一行（TaikoPlayerStats），每个玩家每首歌每个难度一行（TaikoSongStats）
+# 和 search_index 一样挂在 Session 的 after_flush 上，跟写战绩在同一个事务里：
+# 新增的战绩直接在已有统计上累加；删除、修改战绩（最高分没法“减回去”）就把该玩家的统计按战绩重新算一遍。
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+FC_CROWNS = ('GOLD_FC', 'RAINBOW_FC')   # 金冠、虹冠都算 FC
+RAINBOW_CROWN = 'RAINBOW_FC'
+BATCH_SIZE = 1000
+
+# 影响统计的字段：改了哪个都要重算
+_STAT_FIELDS = ('player_id', 'main_category', 'name', 'difficulty', 'score', 'good', 'ok', 'bad', 'crown', 'played_at')
+
+Play = namedtuple('Play', ('id',) + _STAT_FIELDS)
+
+
+def _value(value):
+    return getattr(value, 'value', value)
+
+
+def _later(a, b):
+    return b if a is None or (b is not None and b > a) else a
+
+
+def accuracy(main_category, score, good, ok, bad) -> float:
+    """精度（良 1 分、可 0.5 分），段位和没有分数的记 0"""
+    if _value(main_category) != 'SONG' or score is None:
+        return 0.0
+    good, ok, bad = good or 0, ok or 0, bad or 0
+    total = good + ok + bad
+    if total == 0:
+        return 0.0
+    return round((good + ok * 0.5) / total * 100, 2)
+
+
+def to_play(record) -> Play:
+    return Play(record.id, *(getattr(record, field) for field in _STAT_FIELDS))
+
+
+def _song_key(play: Play) -> tuple:
+    return play.player_id, play.name, play.difficulty or ''
+
+
+# ------------------- 累加 -------------------
+def _empty_player(player_id: int) -> dict:
+    return {'player_id': player_id, 'record_count': 0, 'song_count': 0, 'dan_count': 0, 'best_score': None,
+            'best_accuracy': 0.0, 'full_combo_count': 0, 'rainbow_count': 0, 'last_played_at': None}
+
+
+def _empty_song(key: tuple) -> dict:
+    player_id, name, difficulty = key
+    return {'player_id': player_id, 'name': name, 'difficulty': difficulty, 'play_count': 0, 'best_score': None,
+            'best_accuracy': 0.0, 'full_combo_count': 0, 'rainbow_count': 0, 'best_record_id': None,
+            'last_played_at': None}
+
+
+def _accumulate(plays, players: dict, songs: dict) -> None:
+    """把战绩累加进 players / songs（键不存在就新建）"""
+    for play in plays:
+        is_song = _value(play.main_category) == 'SONG'
+        acc = accuracy(play.main_category, play.score, play.good, play.ok, play.bad)
+        crown = _value(play.crown)
+
+        stats = players.get(play.player_id)
+        if stats is None:
+            stats = players[play.player_id] = _empty_player(play.player_id)
+        stats['record_count'] += 1
+        stats['song_count' if is_song else 'dan_count'] += 1
+        stats['last_played_at'] = _later(stats['last_played_at'], play.played_at)
+        if not is_song:
+            continue
+        if play.score is not None and (stats['best_score'] is None or play.score > stats['best_score']):
+            stats['best_score'] = play.score
+        stats['best_accuracy'] = max(stats['best_accuracy'], acc)
+        stats['full_combo_count'] += crown in FC_CROWNS
+        stats['rainbow_count'] += crown == RAINBOW_CROWN
+
+        key = _song_key(play)
+        song = songs.get(key)
+        if song is None:
+            song = songs[key] = _empty_song(key)
+        song['play_count'] += 1
+        # 同分保留先打出来的那条
+        if play.score is not None and (song['best_score'] is None or play.score > song['best_score']):
+            song['best_score'] = play.score
+            song['best_record_id'] = play.id
+        song['best_accuracy'] = max(song['best_accuracy'], acc)
+        song['full_combo_count'] += crown in FC_CROWNS
+        song['rainbow_count'] += crown == RAINBOW_CROWN
+        song['last_played_at'] = _later(song['last_played_at'], play.played_at)
+
+
+def _tables():
+    from models import TaikoPlayerStats, TaikoRecord, TaikoSongStats
+    return TaikoPlayerStats.__table__, TaikoSongStats.__table__, TaikoRecord.__table__
+
+
+def _insert(conn, players: dict, songs: dict) -> None:
+    player_table, song_table, _ = _tables()
+    now = datetime.utcnow()
+    rows = [dict(stats, updated_at=now) for stats in players.values()]
+    for i in range(0, len(rows), BATCH_SIZE):
+        conn.execute(player_table.insert(), rows[i:i + BATCH_SIZE])
+    rows = list(songs.values())
+    for i in range(0, len(rows), BATCH_SIZE):
+        conn.execute(song_table.insert(), rows[i:i + BATCH_SIZE])
+
+
+# ------------------- 维护 -------------------
+def apply_new(conn, plays: list) -> None:
+    """新增战绩：读出相关的统计行，累加后写回（只碰这些玩家、这些歌）"""
+    player_table, song_table, _ = _tables()
+    player_ids = {play.player_id for play in plays}
+    names = {play.name for play in plays}
+
+    players = {row['player_id']: dict(row) for row in conn.execute(
+        select(player_table).where(player_table.c.player_id.in_(player_ids))).mappings()}
+    songs = {(row['player_id'], row['name'], row['difficulty']): dict(row) for row in conn.execute(
+        select(song_table).where(song_table.c.player_id.in_(player_ids), song_table.c.name.in_(names))).mappings()}
+    existing_players, existing_songs = set(players), set(songs)
+
+    _accumulate(plays, players, songs)
+
+    now = datetime.utcnow()
+    for player_id, stats in players.items():
+        if player_id in existing_players:
+            values = {k: v for k, v in stats.items() if k not in ('player_id', 'updated_at')}
+            conn.execute(player_table.update().where(player_table.c.player_id == player_id)
+                         .values(**values, updated_at=now))
+    for key, stats in songs.items():
+        if key in existing_songs:
+            conn.execute(song_table.update().where(song_table.c.id == stats['id'])
+                         .values(**{k: v for k, v in stats.items() if k != 'id'}))
+    _insert(conn,
+            {k: v for k, v in players.items() if k not in existing_players},
+            {k: v for k, v in songs.items() if k not in existing_songs})
+
+
+def refresh_players(conn, player_ids) -> None:
+    """按战绩重新计算这些玩家的全部统计（删除/修改战绩、批量导入之后用）"""
+    player_table, song_table, record_table = _tables()
+    player_ids = list(player_ids)
+    conn.execute(song_table.delete().where(song_table.c.player_id.in_(player_ids)))
+    conn.execute(player_table.delete().where(player_table.c.player_id.in_(player_ids)))
+    columns = [record_table.c[name] for name in Play._fields]
+    rows = conn.execute(select(*columns).where(record_table.c.player_id.in_(player_ids))
+                        .order_by(record_table.c.id))
+    players, songs = {}, {}
+    _accumulate((Play(*row) for row in rows), players, songs)
+    _insert(conn, players, songs)
+
+
+def rebuild() -> int:
+    """清空并全量重算（流式读战绩），返回玩家数"""
+    player_table, song_table, record_table = _tables()
+    conn = db.session.connection()
+    conn.execute(song_table.delete())
+    conn.execute(player_table.delete())
+    columns = [record_table.c[name] for name in Play._fields]
+    rows = conn.execution_options(yield_per=BATCH_SIZE).execute(select(*columns).order_by(record_table.c.id))
+    players, songs = {}, {}
+    _accumulate((Play(*row) for row in rows), players, songs)
+    _insert(conn, players, songs)
+    db.session.commit()
+    return len(players)
+
+
+def _changed(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in _STAT_FIELDS)
+
+
+def _before_flush(session, flush_context, instances):
+    """删用户之前先删掉他的统计行（开了 foreign_keys，统计行会挡住删除）"""
+    from models import User
+    player_ids = [obj.id for obj in session.deleted if isinstance(obj, User) and obj.id is not None]
+    if not player_ids:
+        return
+    player_table, song_table, _ = _tables()
+    conn = session.connection()
+    conn.execute(song_table.delete().where(song_table.c.player_id.in_(player_ids)))
+    conn.execute(player_table.delete().where(player_table.c.player_id.in_(player_ids)))
+
+
+def _after_flush(session, flush_context):
+    """和业务写入同一个事务里更新统计"""
+    from models import TaikoRecord
+
+    stale = set()  # 需要整体重算的玩家
+    for obj in session.dirty:
+        if isinstance(obj, TaikoRecord) and _changed(obj):
+            history = inspect(obj).attrs.player_id.history
+            stale.update(pid for pid in (history.deleted or ()) if pid is not None)
+            stale.add(obj.player_id)
+    for obj in session.deleted:
+        if isinstance(obj, TaikoRecord):
+            stale.add(obj.player_id)
+    new = [to_play(obj) for obj in session.new if isinstance(obj, TaikoRecord) and obj.player_id not in stale]
+    if not stale and not new:
+        return
+
+    conn = session.connection()
+    if stale:
+        refresh_players(conn, stale)
+    if new:
+        apply_new(conn, new)
+
+
+def init_app(app):
+    """挂写入同步钩子；旧库第一次启动时补算一遍；注册重算命令"""
+    with app.app_context():
+        from models import TaikoPlayerStats, TaikoRecord
+        if not db.session.query(TaikoPlayerStats.player_id).first() and db.session.query(TaikoRecord.id).first():
+            rebuild()
+        db.session.remove()
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+
+    @app.cli.command('taiko-stats-rebuild')
+    def taiko_stats_rebuild_command():
+        """按全部战绩重算太鼓统计"""
+        click.echo(f'[TAIKO] 统计重算完成，共 {rebuild()} 名玩家')
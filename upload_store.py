@@ -0,0 +1,310 @@
+# upload_store.py —— 上传图片按内容寻址存储：文件名就是 SHA-256，同一张图只存一份
+# 引用关系记在 PostImage / TaikoRecordImage（一行一个引用），最后一个引用删掉时才删文件。
+# 上传在 multipart 解析时就逐块落盘、算哈希、查大小和文件头（UploadRequest），不合格的边收边拒。
+# 数据文件（.csv / .json / .jsonl，批量导入用）同样流式落盘，只是不查图片文件头、用单独的大小上限。
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+import click
+from flask import Request, current_app, flash, redirect, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from extensions import db
+from image_pipeline import discard as discard_variants, image_pipeline
+
+STORE_KINDS = ('post', 'taiko')
+CHUNK_SIZE = 64 * 1024
+
+DEFAULT_MAX_CONTENT_LENGTH = 64 * 1024 * 1024  # 整个请求（Flask 自带的 MAX_CONTENT_LENGTH，按 Content-Length 直接拒）
+DEFAULTS = {
+    'UPLOAD_MAX_FILE_SIZE': 16 * 1024 * 1024,   # 单个文件
+    'UPLOAD_MAX_DATA_SIZE': 48 * 1024 * 1024,   # 单个数据文件（战绩导入）
+    'UPLOAD_TMP_DIR': None,                     # 默认 instance/uploads_tmp，最好和 static 在同一个分区
+}
+
+# 文件头 -> 扩展名（只认这几种图片，扩展名以文件头为准）
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+)
+_SNIFF_BYTES = 16
+
+DATA_EXTENSIONS = {'csv', 'json', 'jsonl'}
+
+_IMAGE_REF_RE = re.compile(r'!\[[^\]]*\]\((/static/uploads/(post|taiko)/[^)\s]+)\)')
+
+
+def extract_urls(text: str, kind: str) -> list:
+    """Markdown 里引用的某类上传图片（按出现顺序去重）"""
+    urls = []
+    for url, url_kind in _IMAGE_REF_RE.findall(text or ''):
+        if url_kind == kind and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def _folder(kind: str) -> str:
+    return os.path.join(current_app.root_path, 'static', 'uploads', kind)
+
+
+def url_to_path(url: str) -> str:
+    return os.path.join(current_app.root_path, url.lstrip('/'))
+
+
+# ------------------- 接收 -------------------
+def sniff(head: bytes):
+    """按文件头判断图片类型，认不出返回 None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def _human_size(size: int) -> str:
+    return f'{size / 1024 / 1024:.0f} MB' if size >= 1024 * 1024 else f'{size / 1024:.0f} KB'
+
+
+def _tmp_dir() -> str:
+    directory = current_app.config['UPLOAD_TMP_DIR'] or os.path.join(current_app.instance_path, 'uploads_tmp')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class IngestStream:
+    """
+    multipart 解析时 Werkzeug 往这里逐块写：直接落盘（不占内存）、增量算 SHA-256，
+    超过单文件上限或文件头不是图片就立刻抛 413/415，剩下的数据不再接收
+    """
+
+    def __init__(self, directory: str, max_size: int, check_type: bool = True):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, suffix='.part', delete=False)
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._claimed = False
+        self.max_size = max_size
+        self.check_type = check_type
+        self.size = 0
+        self.kind = None
+
+    @property
+    def name(self) -> str:
+        return self._file.name
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(f'单个文件不能超过 {_human_size(self.max_size)}')
+        if self.check_type and self.kind is None and len(self._head) < _SNIFF_BYTES:
+            self._head += data[:_SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= _SNIFF_BYTES:
+                self._check()
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _check(self):
+        self.kind = sniff(self._head)
+        if self.kind is None:
+            self.close()
+            raise UnsupportedMediaType('只能上传 PNG / JPEG / GIF / WebP / BMP 图片')
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # 解析器写完一个文件会 seek(0)：不足 16 字节的小文件在这里补查文件头
+        if self.check_type and self.kind is None and self.size:
+            self._check()
+        return self._file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def claim(self, path: str) -> None:
+        """把临时文件移到正式位置"""
+        self._file.close()
+        shutil.move(self.name, path)
+        self._claimed = True
+
+    def close(self) -> None:
+        self._file.close()
+        if not self._claimed and os.path.exists(self.name):
+            os.remove(self.name)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    @classmethod
+    def from_stream(cls, stream, max_size: int):
+        """不是经过 UploadRequest 解析来的文件（命令行等），也走同样的检查"""
+        ingest = cls(_tmp_dir(), max_size)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            ingest.write(chunk)
+        ingest.seek(0)
+        return ingest
+
+
+class UploadRequest(Request):
+    """上传文件不走 Werkzeug 默认的内存/临时文件，直接写进 IngestStream"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if (filename or '').rsplit('.', 1)[-1].lower() in DATA_EXTENSIONS:
+            return IngestStream(_tmp_dir(), current_app.config['UPLOAD_MAX_DATA_SIZE'], check_type=False)
+        return IngestStream(_tmp_dir(), current_app.config['UPLOAD_MAX_FILE_SIZE'])
+
+
+# ------------------- 写入 -------------------
+def store(file, kind: str):
+    """保存上传文件，返回 /static/uploads/<kind>/<sha256>.<ext>；内容相同的文件只留一份"""
+    if not file or not file.filename:
+        return None
+    stream = file.stream
+    if not isinstance(stream, IngestStream):
+        stream = IngestStream.from_stream(stream, current_app.config['UPLOAD_MAX_FILE_SIZE'])
+    if not stream.size:
+        stream.close()
+        return None
+    if stream.kind is None:  # 数据文件（没查文件头）不能当图片存
+        stream.close()
+        raise UnsupportedMediaType('只能上传 PNG / JPEG / GIF / WebP / BMP 图片')
+
+    folder = _folder(kind)
+    os.makedirs(folder, exist_ok=True)
+
+    # 哈希在接收时已经算好，这里只是改个名
+    name = f'{stream.sha256}.{stream.kind}'
+    path = os.path.join(folder, name)
+    url = f'/static/uploads/{kind}/{name}'
+    if os.path.exists(path):
+        stream.close()  # 已经有同一张图了
+    else:
+        stream.claim(path)
+        image_pipeline.submit(url)
+    return url
+
+
+# ------------------- 引用 -------------------
+def sync_post_images(post) -> set:
+    """按正文里实际引用的图片同步 PostImage，返回这篇文章不再引用的 url（commit 后交给 collect）"""
+    from models import PostImage
+    wanted = extract_urls(post.content, 'post')
+    current = {image.url: image for image in post.images} if post.id else {}
+    for url in wanted:
+        if url not in current:
+            post.images.append(PostImage(url=url))
+    released = set(current) - set(wanted)
+    for url in released:
+        db.session.delete(current[url])
+    return released
+
+
+def sync_record_images(record) -> set:
+    """同上，战绩的截图在备注和 screenshot 字段里"""
+    from models import TaikoRecordImage
+    wanted = extract_urls(record.note, 'taiko')
+    if record.screenshot and record.screenshot not in wanted and record.screenshot.startswith('/static/uploads/taiko/'):
+        wanted.insert(0, record.screenshot)
+    current = {image.url: image for image in record.images} if record.id else {}
+    for url in wanted:
+        if url not in current:
+            record.images.append(TaikoRecordImage(url=url))
+    released = set(current) - set(wanted)
+    for url in released:
+        db.session.delete(current[url])
+    return released
+
+
+def image_urls(item) -> list:
+    """删除前先取出引用的图片（行会随 cascade 一起删掉）"""
+    return [image.url for image in item.images]
+
+
+def ref_count(url: str) -> int:
+    """引用计数（两张表 url 列都有索引）"""
+    from models import PostImage, TaikoRecordImage
+    return (db.session.query(PostImage.id).filter_by(url=url).count()
+            + db.session.query(TaikoRecordImage.id).filter_by(url=url).count())
+
+
+def collect(urls) -> int:
+    """commit 之后调用：已经没有引用的文件删掉（连同派生图），返回删除的文件数"""
+    removed = 0
+    for url in set(urls):
+        if ref_count(url):
+            continue
+        discard_variants(url)
+        path = url_to_path(url)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    db.session.commit()
+    return removed
+
+
+def rebuild_refs() -> int:
+    """按现有正文重建全部引用行（旧数据从没写过这两张表），返回引用数"""
+    from models import Post, PostImage, TaikoRecord, TaikoRecordImage
+    for post in Post.query.order_by(Post.id).yield_per(100):
+        sync_post_images(post)
+    for record in TaikoRecord.query.order_by(TaikoRecord.id).yield_per(100):
+        sync_record_images(record)
+    db.session.commit()
+    return PostImage.query.count() + TaikoRecordImage.query.count()
+
+
+def _reject_upload(error):
+    """上传被拒：回到提交页面并提示（不是页面提交的就直接返回错误）"""
+    if request.referrer:
+        flash(f'上传失败：{error.description}', 'danger')
+        return redirect(request.referrer)
+    return error
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    if app.config['MAX_CONTENT_LENGTH'] is None:
+        app.config['MAX_CONTENT_LENGTH'] = DEFAULT_MAX_CONTENT_LENGTH
+    app.request_class = UploadRequest
+    app.register_error_handler(RequestEntityTooLarge, _reject_upload)
+    app.register_error_handler(UnsupportedMediaType, _reject_upload)
+
+    with app.app_context():
+        from models import Post, PostImage, TaikoRecordImage
+        never_synced = not db.session.query(PostImage.id).first() and not db.session.query(TaikoRecordImage.id).first()
+        if never_synced and Post.query.filter(Post.content.contains('/static/uploads/')).first():
+            rebuild_refs()
+        db.session.remove()
+
+    @app.cli.command('upload-refs')
+    @click.option('--gc', is_flag=True, help='顺便删掉上传目录里没有任何引用的文件')
+    def upload_refs_command(gc):
+        """按正文重建图片引用表"""
+        total = rebuild_refs()
+        click.echo(f'[UPLOAD] 引用重建完成，共 {total} 条')
+        if gc:
+            orphans = []
+            for kind in STORE_KINDS:
+                folder = _folder(kind)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    if os.path.isfile(os.path.join(folder, name)):
+                        orphans.append(f'/static/uploads/{kind}/{name}')
+            click.echo(f'[UPLOAD] 删除无引用文件 {collect(orphans)} 个')
@@ -1,18 +1,17 @@
-import os
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.utils import secure_filename
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 
 from users.forms import RegisterForm, LoginForm, ChangePasswordForm, UpdateEmailForm
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from models import User, Post, TaikoRecord, Favorite
+from pagination import Key, paginate
+import loading
+import favorites as favorite_service
+import upload_store
 
 users_blueprint = Blueprint('users', __name__, template_folder='templates/user')
 
-from werkzeug.utils import secure_filename
-import os
-
 AVATAR_UPLOAD_FOLDER = 'static/uploads/avatar'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -21,16 +20,12 @@ def allowed_file(filename):
 
 @users_blueprint.route('/register', methods=['GET', 'POST'])
 def register():
-    from app import create_app
-
-    app = create_app()
     # Create signup form object
     form1 = RegisterForm()
 
     # If request method is POST or form is valid
     if form1.validate_on_submit():
-        with app.app_context():
-            u1 = User.query.filter_by(email=form1.email.data).first()
+        u1 = User.query.filter_by(email=form1.email.data).first()
         # If this returns a user, then the email already exists in database
 
         # If email already exists redirect user back to signup page with error message so user can try again
@@ -53,7 +48,7 @@ def register():
         db.session.add(new_user)
         db.session.commit()
 
-        app.logger.info(f"User registered: {form1.email.data}, IP: {request.remote_addr}")
+        current_app.logger.info(f"User registered: {form1.email.data}, IP: {request.remote_addr}")
         # Sends user to login page
         return redirect(url_for('users.login'))
     # If request method is GET or form not valid re-render signup page
@@ -62,80 +57,53 @@ def register():
 
 @users_blueprint.route('/login', methods=['GET', 'POST'])
 def login():
-    from app import create_app
-    app = create_app()
-
-    print("\n[DEBUG] === 登录请求开始 ===")
-    print(f"[DEBUG] 请求方法: {request.method}")
-    print(f"[DEBUG] 当前用户是否已登录: {current_user.is_authenticated}")
+    logger = current_app.logger
 
     # Create login form object
     form = LoginForm(request.form)
 
-    print(f"[DEBUG] 表单数据: login={form.login.data}, password={'*' * len(form.password.data) if form.password.data else None}")
-    print(f"[DEBUG] 表单验证结果: {form.validate_on_submit()}")
-    if form.errors:
-        print(f"[DEBUG] 表单错误: {form.errors}")
-
     if request.method == 'POST' and form.validate_on_submit():
-        print("[DEBUG] 表单验证通过，开始查询用户...")
-
         # 支持用户名或邮箱登录
         user = User.query.filter(
             (User.username == form.login.data) | (User.email == form.login.data)
         ).first()
 
-        if user:
-            print(f"[DEBUG] 找到用户: {user.username} (id={user.id}, email={user.email}, is_admin={user.is_admin})")
-            password_correct = user.verify_password(form.password.data)
-            print(f"[DEBUG] 密码验证结果: {password_correct}")
-        else:
-            print("[DEBUG] 未找到匹配的用户（用户名或邮箱都不存在）")
-            password_correct = False
-
-        if user and password_correct:
-            print("[DEBUG] 登录验证成功，开始登录用户")
+        if user and user.verify_password(form.password.data):
             login_user(user)
 
             # Update user login details
-            print("[DEBUG] 更新登录信息...")
             user.last_login = user.current_login
             user.current_login = datetime.utcnow()
             user.last_login_ip = user.current_login_ip or request.remote_addr
             user.current_login_ip = request.remote_addr
-            user.total_logins += 1
+            user.total_logins = (user.total_logins or 0) + 1
             # user.update_security_fields_on_login(ip_addr=request.remote_addr)
 
             try:
                 db.session.commit()
-                print("[DEBUG] 数据库提交成功")
-            except Exception as e:
+            except Exception:
                 db.session.rollback()
-                print(f"[DEBUG] 数据库提交失败: {e}")
+                logger.exception(f"Failed to update login details for user id={user.id}")
 
             # Set session variables
             session['logged_in'] = True
             session['user_id'] = user.id
-            app.logger.info(f"User logged in: {user.email} (username: {user.username}), IP: {request.remote_addr}")
+            logger.info(f"User logged in: {user.email} (username: {user.username}), IP: {request.remote_addr}")
             flash('You have been logged in.', 'success')
-            print("[DEBUG] Flash 消息已发送")
 
             # 跳转判断
             if user.is_admin_user():
-                print("[DEBUG] 用户是管理员，准备跳转到 admin.dashboard")
                 return redirect(url_for('admin.dashboard'))
-            else:
-                print("[DEBUG] 普通用户，准备跳转到 index")
-                return redirect(url_for('index'))
+            return redirect(url_for('index'))
 
-        else:
-            print("[DEBUG] 登录失败（用户不存在或密码错误）")
-            flash('Invalid username/email or password.', 'danger')
+        # 用户不存在和密码错误不区分，避免泄露账号是否存在
+        logger.warning(f"Login failed for '{form.login.data}' "
+                       f"({'wrong password' if user else 'unknown user'}), IP: {request.remote_addr}")
+        flash('Invalid username/email or password.', 'danger')
 
-    else:
-        print("[DEBUG] 未提交 POST 或表单验证失败，渲染登录页面")
+    elif form.errors:
+        logger.debug(f"Login form invalid: {form.errors}")
 
-    print("[DEBUG] === 登录请求结束，渲染登录模板 ===\n")
     return render_template('user/login.html', form=form)
 
 
@@ -199,14 +167,11 @@ def update_email():
 @users_blueprint.route('/logout')
 @login_required
 def logout():
-    from app import create_app
-    app = create_app()
-
     # Log out the user and update the session
     user_info = f"User logged out: {current_user.email}, IP: {request.remote_addr}"
     logout_user()
     session['logged_in'] = False
-    app.logger.info(user_info)
+    current_app.logger.info(user_info)
 
     # Redirect to the home page
     return redirect(url_for('index'))
@@ -222,25 +187,11 @@ def toggle_favorite(type, item_id):
         flash('无效类型', 'danger')
         return redirect(request.referrer or url_for('index'))
 
-    favorite = Favorite.query.filter_by(
-        user_id=current_user.id,
-        post_id=item_id if type == 'post' else None,
-        taiko_id=item_id if type == 'taiko' else None
-    ).first()
-
-    if favorite:
-        db.session.delete(favorite)
-        db.session.commit()
-        flash('已取消收藏', 'info')
-    else:
-        favorite = Favorite(
-            user_id=current_user.id,
-            post_id=item_id if type == 'post' else None,
-            taiko_id=item_id if type == 'taiko' else None
-        )
-        db.session.add(favorite)
-        db.session.commit()
+    # 走 (user_id, post_id/taiko_id) 唯一索引：先删，删不到再插
+    if favorite_service.toggle(current_user.id, type, item.id):
         flash('收藏成功', 'success')
+    else:
+        flash('已取消收藏', 'info')
 
     return redirect(request.referrer or url_for('index'))
 
@@ -249,9 +200,8 @@ def toggle_favorite(type, item_id):
 @login_required
 def my_favorites():
     # 正确写法：从 Favorite 模型查询，过滤当前用户，按时间倒序
-    favorites = Favorite.query.filter_by(user_id=current_user.id)\
-                              .order_by(Favorite.created_at.desc())\
-                              .all()
+    favorites = paginate(loading.apply(Favorite.query.filter_by(user_id=current_user.id), 'favorite_list'),
+                         [Key(Favorite.created_at), Key(Favorite.id)])
     return render_template('user/my_favorites.html', favorites=favorites)
 
 @users_blueprint.route('/my_account', methods=['GET', 'POST'])
@@ -261,12 +211,10 @@ def my_account():
         # 头像上传（所有用户）
         if 'avatar' in request.files:
             file = request.files['avatar']
-            if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(f"{current_user.id}_{int(datetime.utcnow().timestamp())}_{file.filename}")
-                file_path = os.path.join(AVATAR_UPLOAD_FOLDER, filename)
-                os.makedirs(AVATAR_UPLOAD_FOLDER, exist_ok=True)
-                file.save(file_path)
-                current_user.avatar = filename
+            # 上传时已经边收边校验（大小、文件头），这里按内容哈希存一份
+            url = upload_store.store(file, 'avatar')
+            if url:
+                current_user.avatar = url.rsplit('/', 1)[1]
                 flash('头像更新成功！', 'success')
             else:
                 flash('文件类型不支持或未选择文件', 'danger')
@@ -0,0 +1,109 @@
+# view_counter.py —— 浏览量写回缓冲：每个 worker 在内存里攒着，定期用一条 UPDATE 批量写回
+import atexit
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import case
+
+from extensions import db
+
+DEFAULT_FLUSH_INTERVAL = 10     # 秒：距离上次写回超过这个时间就写一次
+DEFAULT_MAX_PENDING = 100       # 未写回的浏览量上限：worker 异常退出时最多丢这么多
+
+
+class ViewCounter:
+    def __init__(self, app=None):
+        self._pending = Counter()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('VIEW_COUNT', True)  # 静态导出渲染页面时关掉，不算浏览
+        app.config.setdefault('VIEW_COUNT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        app.config.setdefault('VIEW_COUNT_MAX_PENDING', DEFAULT_MAX_PENDING)
+
+        if self._app is None:
+            # 进程正常退出（gunicorn 重启 worker）时把剩下的写回去
+            atexit.register(self._flush_on_exit)
+        self._app = app
+
+        @app.after_request
+        def flush_view_counts(response):
+            self.maybe_flush()
+            return response
+
+    # ------------------- 记录 -------------------
+    def record(self, post_id: int, count: int = 1) -> None:
+        """记一次浏览（只进内存），攒够上限立即写回"""
+        if not self._app.config['VIEW_COUNT']:
+            return
+        with self._lock:
+            self._pending[post_id] += count
+            self._total += count
+            full = self._total >= self._app.config['VIEW_COUNT_MAX_PENDING']
+        if full:
+            self.flush(raise_errors=False)
+
+    def pending(self, post_id: int) -> int:
+        """本 worker 里还没写回的浏览量"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    # ------------------- 写回 -------------------
+    def maybe_flush(self) -> None:
+        interval = self._app.config['VIEW_COUNT_FLUSH_INTERVAL']
+        if self._total and time.monotonic() - self._last_flush >= interval:
+            self.flush(raise_errors=False)
+
+    def flush(self, raise_errors: bool = True) -> int:
+        """
+        把缓冲的浏览量一次性写回数据库，返回写回的次数
+        写失败时浏览量放回缓冲；请求里触发的（raise_errors=False）只记日志，页面已经渲染好了不该因此 500
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        from models import Post
+        table = Post.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id.in_(list(pending)))
+            .values(
+                view_count=db.func.coalesce(table.c.view_count, 0) + case(pending, value=table.c.id, else_=0),
+                updated_at=table.c.updated_at,  # 浏览不算更新，别动 updated_at
+            )
+        )
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception:
+            # 写失败就放回缓冲，下次再试
+            with self._lock:
+                self._pending.update(pending)
+                self._total += sum(pending.values())
+            if raise_errors:
+                raise
+            self._app.logger.exception(f'浏览量写回失败，{sum(pending.values())} 次浏览留在缓冲里下次再试')
+            return 0
+        return sum(pending.values())
+
+    def _flush_on_exit(self):
+        if self._app is None or not self._total:
+            return
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception:
+            self._app.logger.exception('浏览量写回失败')
+
+
+view_counter = ViewCounter()